@@ -0,0 +1,350 @@
+import argparse
+import bisect
+import gc
+import json
+import platform
+import random
+import struct
+import sys
+import threading
+import time
+import tracemalloc
+
+import AVLTree as avl_module
+from ArrayAVLTree import ArrayAVLTree
+from AVLTree import AVLNode, AVLTree
+from ConcurrentAVLTree import ConcurrentAVLTree
+from from_intro_cs import Binary_search_tree
+from TreeEngines import ENGINES
+
+#In order to run this benchmark:
+#  1. this file should be in the same directory as AVLTree.py.
+#  2. run this file using the command: python AVLBenchmark.py [--sizes 1000 10000] [--output results.json]
+#  3. the results are printed (or written to --output) as JSON, one record per
+#     structure, operation, workload and size, so runs can be compared for regressions.
+#  4. --threads N adds a multi-threaded run: N-1 reader threads and one writer thread.
+#  5. --engines also runs the other engines of TreeEngines (array, redblack, treap, btree).
+#  6. the "writes" section counts node attribute writes per insert and delete (node
+#     construction included), the work the rebalancing retrace does per operation.
+#  7. the "node" record gives the bytes of one AVLNode and the fields it has beyond
+#     key, value, parent, height, BF, left and right, with the feature that uses each.
+
+WORKLOADS = ("random", "sorted", "reversed", "partial", "clustered")
+
+# The AVLNode fields beyond the seven every AVL node needs, and what they are for
+EXTRA_FIELDS = dict(sort_key="key_func", size="order_stats", zeros="order_stats", agg="aggregate",
+                    prev="in-order threads", next="in-order threads")
+
+
+def make_keys(workload, n, seed=0):
+    """Returns the n keys 0..n-1 in the order of the workload."""
+    rng = random.Random(seed)
+    keys = list(range(n))
+    if workload == "random":
+        rng.shuffle(keys)
+    elif workload == "reversed":
+        keys.reverse()
+    elif workload == "partial":
+        # sorted, with 10% of the keys swapped with a random other key
+        for _ in range(n // 10):
+            i, j = rng.randrange(n), rng.randrange(n)
+            keys[i], keys[j] = keys[j], keys[i]
+    elif workload == "clustered":
+        # runs of 64 neighbouring keys in random order, each run shuffled
+        runs = [keys[i:i + 64] for i in range(0, n, 64)]
+        rng.shuffle(runs)
+        for run in runs:
+            rng.shuffle(run)
+        keys = [key for run in runs for key in run]
+    return keys
+
+
+def rss_bytes():
+    """Current resident set size of this process, or 0 when it can't be read."""
+    try:
+        with open("/proc/self/statm") as statm:
+            pages = int(statm.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return 0
+    import resource
+    return pages * resource.getpagesize()
+
+
+def bst_depth(tree):
+    """Depth of a Binary_search_tree, without recursion so degenerate trees don't overflow."""
+    depth = -1
+    level = [tree.root] if tree.root is not None else []
+    while level:
+        depth += 1
+        level = [child for node in level for child in (node.left, node.right) if child is not None]
+    return depth
+
+
+def timed(function, keys, count=False):
+    """Calls function on every key, returns (ops per second, sum of the results if count)."""
+    total = 0
+    start = time.perf_counter()
+    for key in keys:
+        result = function(key)
+        if count:
+            total += result
+    elapsed = time.perf_counter() - start
+    return len(keys) / elapsed if elapsed else float("inf"), total
+
+
+def record(results, structure, operation, workload, n, ops_per_sec, **extra):
+    results.append(dict(structure=structure, operation=operation, workload=workload, n=n,
+                        ops_per_sec=round(ops_per_sec, 1), **extra))
+
+
+def bench_avl(results, workload, n):
+    keys = make_keys(workload, n)
+    lookups = make_keys("random", n, seed=1)
+
+    for start in ("root", "max", "finger", "auto"):
+        tree = AVLTree()
+        ops, rebalance_ops = timed(lambda key: tree.insert(key, "v", start), keys, True)
+        record(results, "AVLTree", "insert_" + start, workload, n, ops,
+               rebalance_ops=rebalance_ops, depth=tree.get_root().height)
+
+    ops, _ = timed(tree.search, lookups)
+    record(results, "AVLTree", "search", workload, n, ops)
+
+    start = time.perf_counter()
+    tree.avl_to_array()
+    record(results, "AVLTree", "avl_to_array", workload, n, n / (time.perf_counter() - start))
+
+    ops, rebalance_ops = timed(lambda key: tree.delete(tree.search(key)), keys, True)
+    record(results, "AVLTree", "delete", workload, n, ops, rebalance_ops=rebalance_ops)
+
+
+def bench_engine(results, engine, workload, n):
+    """Times insert, search, avl_to_array and delete on a TreeEngines engine."""
+    keys = make_keys(workload, n)
+    lookups = make_keys("random", n, seed=1)
+    tree = ENGINES[engine]()
+    name = type(tree).__name__
+    ops, rebalance_ops = timed(lambda key: tree.insert(key, "v"), keys, True)
+    record(results, name, "insert", workload, n, ops, rebalance_ops=rebalance_ops)
+    ops, _ = timed(tree.search, lookups)
+    record(results, name, "search", workload, n, ops)
+    start = time.perf_counter()
+    tree.avl_to_array()
+    record(results, name, "avl_to_array", workload, n, n / (time.perf_counter() - start))
+    ops, rebalance_ops = timed(lambda key: tree.delete(tree.search(key)), keys, True)
+    record(results, name, "delete", workload, n, ops, rebalance_ops=rebalance_ops)
+
+
+def bench_bst(results, workload, n):
+    keys = make_keys(workload, n)
+    lookups = make_keys("random", n, seed=1)
+    tree = Binary_search_tree()
+    ops, _ = timed(lambda key: tree.insert(key, "v"), keys)
+    record(results, "Binary_search_tree", "insert", workload, n, ops, depth=bst_depth(tree))
+    ops, _ = timed(tree.lookup, lookups)
+    record(results, "Binary_search_tree", "search", workload, n, ops)
+
+
+def bench_memory(make_tree, n):
+    """Returns (traced bytes per key, RSS growth per key, gc-tracked objects per key)."""
+    keys = make_keys("random", n)
+    gc.collect()
+    objects_before = len(gc.get_objects())
+    rss_before = rss_bytes()
+    tracemalloc.start()
+    tree = make_tree()
+    for key in keys:
+        tree.insert(key, "v")
+    traced, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    gc.collect()
+    result = (traced / n, (rss_bytes() - rss_before) / n, (len(gc.get_objects()) - objects_before) / n)
+    del tree
+    return result
+
+
+def node_layout():
+    """Returns the bytes of an AVLNode, and the bytes it would take without EXTRA_FIELDS."""
+    node_bytes = sys.getsizeof(AVLNode(0))
+    extra_bytes = struct.calcsize("P") * len(EXTRA_FIELDS) # one pointer per slot
+    return dict(structure="AVLNode", bytes_per_node=node_bytes, bytes_without_extra_fields=node_bytes - extra_bytes,
+                extra_fields=EXTRA_FIELDS)
+
+
+def bench_lookups(keys, queries):
+    """Returns ns per point lookup for AVLTree.search, a dict and bisect on a sorted list."""
+    tree = AVLTree.bulk_load((key, "v") for key in keys)
+    table = dict.fromkeys(keys, "v")
+    sorted_keys = sorted(keys)
+
+    def bisect_search(key):
+        i = bisect.bisect_left(sorted_keys, key)
+        return i < len(sorted_keys) and sorted_keys[i] == key
+
+    result = {}
+    for name, lookup in (("AVLTree.search", tree.search), ("dict.get", table.get), ("bisect", bisect_search)):
+        start = time.perf_counter()
+        for key in queries:
+            lookup(key)
+        result[name] = (time.perf_counter() - start) / len(queries) * 1e9
+    return result
+
+
+class CountingNode(AVLNode):
+    """An AVLNode that counts every attribute write, for bench_writes."""
+    __slots__ = ()
+    writes = 0
+
+    def __setattr__(self, name, val):
+        CountingNode.writes += 1
+        object.__setattr__(self, name, val)
+
+
+def bench_writes(workload, n):
+    """Returns node attribute writes per insert and per delete, with trees of CountingNodes."""
+    keys = make_keys(workload, n)
+    avl_module.AVLNode = CountingNode
+    try:
+        tree = AVLTree()
+        CountingNode.writes = 0
+        for key in keys:
+            tree.insert(key, "v")
+        insert_writes = CountingNode.writes / n
+        CountingNode.writes = 0
+        for key in make_keys("random", n, seed=1):
+            tree.delete(tree.search(key))
+        delete_writes = CountingNode.writes / n
+    finally:
+        avl_module.AVLNode = AVLNode
+    return insert_writes, delete_writes
+
+
+class LockedAVLTree(object):
+    """The baseline for bench_concurrent, an AVLTree behind one mutex."""
+
+    def __init__(self):
+        self.tree = AVLTree()
+        self.lock = threading.Lock()
+
+    def search(self, key):
+        with self.lock:
+            return self.tree.search(key)
+
+    def insert(self, key, val):
+        with self.lock:
+            self.tree.insert(key, val)
+
+    def avl_to_array(self):
+        with self.lock:
+            return self.tree.avl_to_array()
+
+
+def bench_concurrent(n, threads, seconds):
+    """Runs threads - 1 readers and one writer on each thread-safe tree for the given seconds.
+
+    Readers also check that every version they read is sorted, as a stress test."""
+    reports = []
+    structures = (("LockedAVLTree", LockedAVLTree, "insert"),
+                  ("ConcurrentAVLTree", ConcurrentAVLTree, "insert"),
+                  ("ConcurrentAVLTree.queued", ConcurrentAVLTree, "submit_insert"))
+    for name, make_tree, write in structures:
+        tree = make_tree()
+        for key in make_keys("random", n):
+            tree.insert(2 * key, "v")
+        stop = threading.Event()
+        counts = [0] * threads
+        errors = []
+
+        def reader(i):
+            rng = random.Random(i)
+            while not stop.is_set():
+                for _ in range(100):
+                    tree.search(rng.randrange(4 * n))
+                counts[i] += 100
+                if i == 1 and counts[i] % 10000 == 0:
+                    keys = [key for key, _ in tree.avl_to_array()]
+                    if keys != sorted(keys):
+                        errors.append("unsorted snapshot")
+
+        def writer():
+            insert = getattr(tree, write)
+            rng = random.Random(0)
+            while not stop.is_set():
+                for _ in range(100):
+                    insert(2 * rng.randrange(2 * n) + 1, "w")
+                counts[0] += 100
+
+        workers = [threading.Thread(target=writer)] + [threading.Thread(target=reader, args=(i,)) for i in range(1, threads)]
+        for worker in workers:
+            worker.start()
+        time.sleep(seconds)
+        stop.set()
+        for worker in workers:
+            worker.join()
+        if hasattr(tree, "close"):
+            tree.close()
+        reports.append(dict(structure=name, n=n, threads=threads, reads_per_sec=round(sum(counts[1:]) / seconds, 1),
+                            writes_per_sec=round(counts[0] / seconds, 1), errors=errors))
+    return reports
+
+
+def run(sizes, workloads, bst_max, threads=0, seconds=2.0, engines=()):
+    results, memory, lookups, writes = [], [], [], []
+    for n in sizes:
+        for workload in workloads:
+            bench_avl(results, workload, n)
+            # An unbalanced BST is quadratic on ordered input, so it is capped there
+            if workload == "random" or n <= bst_max:
+                bench_bst(results, workload, n)
+            for engine in engines:
+                bench_engine(results, engine, workload, n)
+            insert_writes, delete_writes = bench_writes(workload, n)
+            writes.append(dict(workload=workload, n=n, writes_per_insert=round(insert_writes, 2),
+                               writes_per_delete=round(delete_writes, 2)))
+
+        for structure, make_tree in (("AVLTree", AVLTree), ("ArrayAVLTree", ArrayAVLTree),
+                                     ("Binary_search_tree", Binary_search_tree)):
+            traced, rss, objects = bench_memory(make_tree, n)
+            memory.append(dict(structure=structure, n=n, traced_bytes_per_key=round(traced, 1),
+                               rss_bytes_per_key=round(rss, 1), objects_per_key=round(objects, 2)))
+
+        # Point lookups, 80% hits
+        rng = random.Random(2)
+        keys = make_keys("random", n)
+        queries = [rng.randrange(n) if rng.random() < 0.8 else n + rng.randrange(n) for _ in range(n)]
+        for name, ns in bench_lookups(keys, queries).items():
+            lookups.append(dict(structure=name, n=n, ns_per_op=round(ns, 1)))
+
+    report = dict(python=platform.python_version(), machine=platform.machine(), node=node_layout(),
+                  results=results, memory=memory, lookups=lookups, writes=writes)
+    if threads > 1:
+        report["concurrent"] = [record for n in sizes for record in bench_concurrent(n, threads, seconds)]
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AVLTree benchmark suite")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="numbers of keys, up to 10**7")
+    parser.add_argument("--workloads", nargs="+", choices=WORKLOADS, default=list(WORKLOADS))
+    parser.add_argument("--bst-max", type=int, default=2000,
+                        help="largest n for Binary_search_tree on ordered workloads")
+    parser.add_argument("--threads", type=int, default=0,
+                        help="also run the multi-threaded benchmark with this many threads")
+    parser.add_argument("--seconds", type=float, default=2.0, help="duration of each multi-threaded run")
+    parser.add_argument("--engines", nargs="*", choices=[name for name in ENGINES if name != "avl"], default=[],
+                        help="other engines to compare with AVLTree")
+    parser.add_argument("--output", help="write the JSON here instead of to stdout")
+    args = parser.parse_args()
+
+    report = run(args.sizes, args.workloads, args.bst_max, args.threads, args.seconds, args.engines)
+    if args.output:
+        with open(args.output, "w") as out:
+            json.dump(report, out, indent=1)
+    else:
+        json.dump(report, sys.stdout, indent=1)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""An LRU cache with optional time-to-live, built on two AVLTree indexes.
+
+recency is keyed by an access sequence number, so its min node is the least
+recently used entry; expiry is keyed by (expiry time, sequence number), so its min
+nodes are the first to expire. A dict maps each cache key to its entry, which
+holds its nodes in both trees, so a touch or removal deletes nodes by handle
+without searching. Nodes keep their identity through AVLTree.delete, so the
+handles stay valid while other nodes come and go.
+
+Sequence numbers only grow and a fixed TTL keeps expiry times growing too, so
+new nodes are appended at the max end of both trees.
+"""
+
+import time
+
+from AVLTree import AVLTree
+
+
+def append(tree, key, val):
+    """Inserts key into tree from the max end and returns its node."""
+    tree.insert(key, val, "max")
+    node = tree.max_node
+    return node if node.key == key else tree.search(key)
+
+
+"""
+A class implementing a bounded cache with LRU eviction and expiry.
+"""
+class AVLCache(object):
+
+    """
+    Constructor.
+
+    @type capacity: int
+    @param capacity: the most entries kept, the least recently used are evicted first. None for no limit
+    @type ttl: float
+    @param ttl: seconds an entry lives after it is set, None for no expiry
+    @type clock: callable
+    @param clock: returns the current time in seconds
+    """
+    def __init__(self, capacity=None, ttl=None, clock=time.monotonic):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.clock = clock
+        self.recency = AVLTree()
+        self.expiry = AVLTree()
+        self.entries = {}
+        self.sequence = 0
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        entry = self.entries.get(key)
+        return entry is not None and (entry[3] is None or self.clock() < entry[3])
+
+
+    def next_sequence(self):
+        self.sequence += 1
+        return self.sequence
+
+
+    """returns the value of key and marks it as the most recently used, in O(log n)
+
+    @param key: the cache key
+    @param default: returned when key is missing or expired
+    """
+    def get(self, key, default=None):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        if entry[3] is not None and entry[3] <= self.clock():
+            self.remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return default
+        self.hits += 1
+        self.recency.delete(entry[1])
+        entry[1] = append(self.recency, self.next_sequence(), key)
+        return entry[0]
+
+
+    """sets the value of key, evicting the least recently used entries beyond capacity
+
+    @param key: the cache key
+    @param value: the value to cache
+    @type ttl: float
+    @param ttl: seconds this entry lives, overrides the ttl of the cache
+    """
+    def set(self, key, value, ttl=None):
+        if key in self.entries:
+            self.remove(key)
+        ttl = self.ttl if ttl is None else ttl
+        sequence = self.next_sequence()
+        expires = self.clock() + ttl if ttl is not None else None
+        entry = [value, append(self.recency, sequence, key), None, expires]
+        if expires is not None:
+            entry[2] = append(self.expiry, (expires, sequence), key)
+        self.entries[key] = entry
+
+        while self.capacity is not None and len(self.entries) > self.capacity:
+            self.remove(self.recency.min_node.value)
+            self.evictions += 1
+
+
+    """refreshes the expiry time of key, as if it was set again
+
+    @rtype: bool
+    @returns: True if key was cached and had not expired
+    """
+    def touch(self, key, ttl=None):
+        entry = self.entries.get(key)
+        if entry is None:
+            return False
+        if entry[3] is not None and entry[3] <= self.clock():
+            self.remove(key)
+            self.expirations += 1
+            return False
+        self.set(key, entry[0], ttl)
+        return True
+
+
+    """removes key from the cache
+
+    @rtype: bool
+    @returns: True if key was cached
+    """
+    def remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return False
+        self.recency.delete(entry[1])
+        if entry[2] is not None:
+            self.expiry.delete(entry[2])
+        return True
+
+
+    """removes every entry whose expiry time has passed, in O(log n) per removed entry
+
+    @rtype: int
+    @returns: the number of removed entries
+    """
+    def expire(self):
+        now = self.clock()
+        removed = 0
+        while self.expiry.min_node is not None and self.expiry.min_node.key[0] <= now:
+            self.remove(self.expiry.min_node.value)
+            removed += 1
+        self.expirations += removed
+        return removed
+
+
+    """returns the hit and miss counters
+
+    @rtype: dict
+    """
+    def stats(self):
+        lookups = self.hits + self.misses
+        return dict(size=len(self.entries), hits=self.hits, misses=self.misses, evictions=self.evictions,
+                    expirations=self.expirations, hit_rate=self.hits / lookups if lookups else 0.0)
@@ -0,0 +1,247 @@
+"""A compact binary file format for AVL tree dictionaries.
+
+A file is a header followed by the items in ascending key order:
+
+    header   magic "AVLT", format version, key kind, value kind, item count
+    keys     int keys: n little-endian int64s, if they all fit in one
+             str keys: n + 1 uint64 offsets into a UTF-8 blob, then the blob, if they
+             can all be encoded as UTF-8
+             other keys: the same, each key pickled on its own
+    values   str values: n + 1 uint64 offsets into a UTF-8 blob, then the blob
+             other values: the same, each value pickled on its own
+
+A sorted array is the implicit layout of a perfectly balanced tree (the middle
+item is the root of every range), so the file is enough to rebuild the tree in
+O(n) with AVLTree.from_sorted, or to binary search it in place with MappedAVLTree
+without creating any node.
+"""
+
+import mmap
+import pickle
+import struct
+from array import array
+
+from AVLTree import AVLNode, AVLTree
+
+MAGIC = b"AVLT"
+VERSION = 1
+HEADER = struct.Struct("<4sBBBxQ")
+
+INT_KEYS, STR_KEYS, PICKLED_KEYS = 0, 1, 2
+KEY_COLUMNS = {INT_KEYS: "int", STR_KEYS: "str", PICKLED_KEYS: "pickle"}
+STR_VALUES, PICKLED_VALUES = 0, 1
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+def encode_column(blobs):
+    """Returns the offsets table and the concatenated blob of a list of bytes objects."""
+    offsets = array("Q", [0])
+    position = 0
+    for blob in blobs:
+        position += len(blob)
+        offsets.append(position)
+    return offsets.tobytes() + b"".join(blobs)
+
+
+def str_column(strings):
+    """Returns the column of a list of strs, None if one of them can't be encoded as UTF-8 (a lone surrogate)."""
+    try:
+        return encode_column([string.encode() for string in strings])
+    except UnicodeEncodeError:
+        return None
+
+
+def dump(tree, path):
+    """Writes the items of tree (anything with items() in key order and size()) to path."""
+    if getattr(tree, "key_func", None) is not None:
+        raise ValueError("dump needs a tree ordered by its keys, without a key_func")
+    keys, values = [], []
+    for key, value in tree.items():
+        keys.append(key)
+        values.append(value)
+
+    # Keys and values that don't fit the compact columns fall back to pickled ones
+    key_kind, key_bytes = PICKLED_KEYS, None
+    if all(type(key) is int for key in keys):
+        if not keys or (INT64_MIN <= keys[0] and keys[-1] <= INT64_MAX):
+            key_kind, key_bytes = INT_KEYS, array("q", keys).tobytes()
+    elif all(type(key) is str for key in keys):
+        key_kind, key_bytes = STR_KEYS, str_column(keys)
+    if key_bytes is None:
+        key_kind, key_bytes = PICKLED_KEYS, encode_column([pickle.dumps(key) for key in keys])
+
+    value_kind, value_bytes = STR_VALUES, None
+    if all(type(value) is str for value in values):
+        value_bytes = str_column(values)
+    if value_bytes is None:
+        value_kind, value_bytes = PICKLED_VALUES, encode_column([pickle.dumps(value) for value in values])
+
+    with open(path, "wb") as out:
+        out.write(HEADER.pack(MAGIC, VERSION, key_kind, value_kind, len(keys)))
+        out.write(key_bytes)
+        out.write(value_bytes)
+
+
+class Column(object):
+    """A read-only list view of a column of the file, decoding one entry at a time."""
+
+    def __init__(self, buffer, start, count, kind):
+        self.count = count
+        if kind == "int":
+            self.fixed = buffer[start:start + 8 * count].cast("q")
+            self.end = start + 8 * count
+        else:
+            self.fixed = None
+            self.offsets = buffer[start:start + 8 * (count + 1)].cast("Q")
+            self.blob = buffer[start + 8 * (count + 1):]
+            self.end = start + 8 * (count + 1) + self.offsets[count]
+            self.decode = pickle.loads if kind == "pickle" else bytes.decode
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if self.fixed is not None:
+            return self.fixed[i]
+        return self.decode(bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]))
+
+    def to_list(self):
+        if self.fixed is not None:
+            return self.fixed.tolist()
+        blob, offsets, decode = bytes(self.blob[:self.offsets[self.count]]), self.offsets, self.decode
+        return [decode(blob[offsets[i]:offsets[i + 1]]) for i in range(self.count)]
+
+    def release(self):
+        for view in ("fixed", "offsets", "blob"):
+            if getattr(self, view, None) is not None:
+                getattr(self, view).release()
+
+
+def open_columns(buffer):
+    """Checks the header of a file buffer and returns its (keys, values) columns."""
+    if len(buffer) < HEADER.size:
+        raise ValueError("not an AVL tree file")
+    magic, version, key_kind, value_kind, count = HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise ValueError("not an AVL tree file")
+    if version != VERSION:
+        raise ValueError("unsupported AVL tree file version %d" % version)
+    if key_kind not in KEY_COLUMNS:
+        raise ValueError("unsupported AVL tree key kind %d" % key_kind)
+    keys = Column(buffer, HEADER.size, count, KEY_COLUMNS[key_kind])
+    values = Column(buffer, keys.end, count, "str" if value_kind == STR_VALUES else "pickle")
+    return keys, values
+
+
+def load(path, cls=AVLTree, **options):
+    """Reads a file written by dump and rebuilds it as a cls tree in O(n)."""
+    with open(path, "rb") as source:
+        buffer = memoryview(source.read())
+    keys, values = open_columns(buffer)
+    items = zip(keys.to_list(), values.to_list())
+    keys.release()
+    values.release()
+    return cls.from_sorted(items, **options)
+
+
+"""
+A read-only dictionary answering queries straight from a memory-mapped dump file.
+"""
+class MappedAVLTree(object):
+
+    """
+    Constructor, maps the file in O(1), whatever its size.
+
+    @type path: str
+    @param path: a file written by AVLTree.dump
+    """
+    def __init__(self, path):
+        with open(path, "rb") as source:
+            self.map = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        self.buffer = memoryview(self.map)
+        self.keys, self.values = open_columns(self.buffer)
+
+    def __len__(self):
+        return self.size()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+    """unmaps the file, the tree can't be used afterwards"""
+    def close(self):
+        self.keys.release()
+        self.values.release()
+        self.buffer.release()
+        self.map.close()
+
+
+    def lower_bound_index(self, key):
+        """Returns the index of the first key >= key, descending the implicit balanced layout."""
+        keys = self.keys
+        lo, hi = 0, len(keys)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if keys[mid] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+
+    """searches for a node in the dictionary corresponding to the key
+
+    @type key: int
+    @param key: a key to be searched
+    @rtype: AVLNode
+    @returns: a detached node holding key and its value, None if key is not found
+    """
+    def search(self, key):
+        i = self.lower_bound_index(key)
+        if i < len(self.keys) and self.keys[i] == key:
+            return AVLNode(key, self.values[i])
+        return None
+
+
+    """returns an iterator over the items with keys in the range [lo, hi]
+
+    @rtype: generator
+    @returns: (key, value) tuples with lo <= key <= hi in ascending key order
+    """
+    def range(self, lo, hi):
+        keys, values = self.keys, self.values
+        for i in range(self.lower_bound_index(lo), len(keys)):
+            key = keys[i]
+            if hi < key:
+                return
+            yield key, values[i]
+
+
+    """returns an iterator over the (key, value) pairs of the dictionary in ascending key order
+
+    @rtype: generator
+    """
+    def items(self):
+        keys, values = self.keys, self.values
+        for i in range(len(keys)):
+            yield keys[i], values[i]
+
+
+    """returns an array representing dictionary
+
+    @rtype: list
+    @returns: a sorted list according to key of touples (key, value) representing the data structure
+    """
+    def avl_to_array(self):
+        return list(zip(self.keys.to_list(), self.values.to_list()))
+
+
+    """returns the number of items in dictionary
+
+    @rtype: int
+    """
+    def size(self):
+        return len(self.keys)
@@ -0,0 +1,94 @@
+"""NumPy columns for AVLTree, behind AVLTree.search_many, to_numpy and from_numpy.
+
+The sorted keys and values of a tree are kept as two NumPy arrays in
+tree.array_snapshot, tagged with tree.version. Every change to the tree bumps
+the version, so a stale snapshot is rebuilt in O(n) on its next use. Between
+changes, batches of lookups are a single np.searchsorted over the keys instead
+of one Python-level search per key.
+"""
+
+import numpy as np
+
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+def object_column(items):
+    """Returns a list as a 1-D object array, keeping every item as it is (np.array would
+    coerce mixed types to a common one and split tuples into rows)."""
+    return np.fromiter(items, dtype=object, count=len(items))
+
+
+def key_column(keys):
+    """Returns a list of keys as a 1-D array, typed only when all of them have the same type
+    that NumPy holds without loss: ints that fit in int64, floats or strs."""
+    if not keys:
+        return np.array(keys)
+    kind = type(keys[0])
+    if kind in (int, float, str) and all(type(key) is kind for key in keys):
+        if kind is not int or (INT64_MIN <= min(keys) and max(keys) <= INT64_MAX):
+            return np.array(keys)
+    return object_column(keys)
+
+
+def snapshot(tree):
+    """Returns the (keys, values) arrays of tree, rebuilding them if the tree changed."""
+    cached = tree.array_snapshot
+    if cached is not None and cached[0] == tree.version:
+        return cached[1], cached[2]
+
+    keys, values = [], []
+    for key, value in tree.items():
+        keys.append(key)
+        values.append(value)
+    return store(tree, key_column(keys), object_column(values))
+
+
+def store(tree, keys, values):
+    """Caches read-only keys and values arrays as the snapshot of the current version of tree."""
+    keys.flags.writeable = False
+    values.flags.writeable = False
+    tree.array_snapshot = (tree.version, keys, values)
+    return keys, values
+
+
+def search_many(tree, queries, default=None):
+    """Returns (found mask, values) for an array of queries."""
+    if tree.key_func is not None:
+        raise ValueError("search_many needs a tree ordered by its keys, without a key_func")
+    keys, values = snapshot(tree)
+    if not isinstance(queries, np.ndarray):
+        queries = key_column(list(queries))
+    if len(keys) == 0:
+        return np.zeros(queries.shape, dtype=bool), np.full(queries.shape, default, dtype=object)
+    if queries.dtype.kind != keys.dtype.kind:
+        # NumPy would cast both to a common type, compare them as Python objects instead
+        keys, queries = keys.astype(object), queries.astype(object)
+
+    positions = np.minimum(np.searchsorted(keys, queries), len(keys) - 1)
+    found = keys[positions] == queries
+    result = values[positions]
+    if default is not None:
+        result = np.where(found, result, default)
+    return found, result
+
+
+def from_numpy(cls, keys, values, **options):
+    """Builds a cls tree from unsorted key and value arrays, keeping the last value of a repeated key."""
+    if options.get("key_func") is not None:
+        raise ValueError("from_numpy sorts the keys themselves, it does not take a key_func")
+    if not isinstance(keys, np.ndarray):
+        keys = key_column(list(keys))
+    if not isinstance(values, np.ndarray):
+        values = object_column(list(values))
+    if keys.shape != values.shape:
+        raise ValueError("keys and values must have the same shape")
+
+    order = np.argsort(keys, kind="stable")
+    keys, values = keys[order], values[order]
+    if len(keys):
+        last = np.append(keys[1:] != keys[:-1], True) # the last of every run of equal keys
+        keys, values = keys[last], values[last]
+
+    tree = cls.from_sorted(zip(keys.tolist(), values.tolist()), **options)
+    store(tree, keys, values)
+    return tree
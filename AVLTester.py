@@ -1,5 +1,22 @@
+import os
+import random
+import tempfile
+import threading
 import unittest
-from AVLTree import AVLNode, AVLTree
+try:
+    import numpy
+except ImportError:
+    numpy = None
+from ArrayAVLTree import ArrayAVLTree
+from AVLTree import AVLNode, AVLTree, SUM, MAX, product
+from PersistentAVLTree import PersistentAVLTree
+from ConcurrentAVLTree import ConcurrentAVLTree
+from ShardedAVLTree import ShardedAVLTree
+from AVLFile import MappedAVLTree
+from DurableAVLTree import DurableAVLTree
+from AVLCache import AVLCache
+from IntervalTree import IntervalTree
+from TreeEngines import ENGINES, make_tree
 
 #In order to run this test:
 #  1. this file should be in the same directory as AVLTree.py.
@@ -35,6 +52,42 @@ class SimpleAVLTester(unittest.TestCase):
         self.assertIsNotNone(self.tree.search(20), "FAIL - Key 20 should still exist")
         self.assertIsNotNone(self.tree.search(5), "FAIL - Key 5 should still exist")
 
+    def test_random_invariants(self):
+        """Test heights, balance factors, parent links and bf_zero_cnt against a recomputation after random updates."""
+        rng = random.Random(2024)
+        expected = {}
+
+        def check(node, parent):
+            # Returns the recomputed (height, zero BF count) of the subtree of node
+            if not node.is_real_node():
+                return -1, 0
+            self.assertIs(node.parent, parent, "FAIL - Wrong parent link")
+            left_h, left_zeros = check(node.left, node)
+            right_h, right_zeros = check(node.right, node)
+            self.assertEqual(node.height, 1 + max(left_h, right_h), "FAIL - Wrong height")
+            self.assertEqual(node.BF, left_h - right_h, "FAIL - Wrong BF")
+            self.assertLess(abs(node.BF), 2, "FAIL - Tree is not balanced")
+            return node.height, left_zeros + right_zeros + (node.BF == 0)
+
+        two_child_deletes = 0
+        for step in range(3000):
+            key = rng.randrange(400)
+            if rng.random() < 0.55:
+                self.tree.insert(key, str(key))
+                expected[key] = str(key)
+            elif key in expected:
+                node = self.tree.search(key)
+                two_child_deletes += node.left.is_real_node() and node.right.is_real_node()
+                self.tree.delete(node)
+                del expected[key]
+            if step % 50 == 0 or step > 2900:
+                root = self.tree.get_root()
+                zeros = check(root, None)[1] if root is not None else 0
+                self.assertEqual(self.tree.bf_zero_cnt, zeros, "FAIL - Wrong bf_zero_cnt")
+                self.assertEqual(self.tree.avl_to_array(), sorted(expected.items()), "FAIL - Wrong items")
+                self.assertEqual(self.tree.size(), len(expected), "FAIL - Wrong size")
+        self.assertGreater(two_child_deletes, 100, "FAIL - Too few deletes of nodes with two children")
+
     def test_size(self):
         """Test size functionality."""
         self.assertEqual(self.tree.size(), 0, "FAIL - Size of empty tree should be 0")
@@ -70,5 +123,623 @@ class SimpleAVLTester(unittest.TestCase):
         self.tree.insert(5, "five")
         self.assertEqual(self.tree.get_amir_balance_factor(), 1.0, "FAIL - Amir's balance factor should be 1.0 for a balanced tree")
 
+    def test_shared_virtual_node(self):
+        """Test that all virtual leaves are the same read-only node."""
+        self.tree.insert(10, "ten")
+        self.tree.insert(20, "twenty")
+        self.tree.insert(5, "five")
+        self.tree.delete(self.tree.search(20))
+        root = self.tree.get_root()
+        self.assertIs(root.right, root.left.left, "FAIL - Virtual leaves should be shared")
+        self.assertFalse(root.right.is_real_node(), "FAIL - Shared leaf should be virtual")
+        with self.assertRaises(AttributeError):
+            root.right.parent = root
+
+    def test_compact_nodes(self):
+        """Test that nodes use slots instead of a per-instance dict."""
+        self.tree.insert(10, "ten")
+        self.assertFalse(hasattr(self.tree.get_root(), "__dict__"), "FAIL - Nodes should not carry a __dict__")
+        with self.assertRaises(AttributeError):
+            self.tree.get_root().colour = "red"
+
+    def test_from_sorted(self):
+        """Test building a balanced tree from sorted items."""
+        items = [(i, str(i)) for i in range(100)]
+        tree = AVLTree.from_sorted(items)
+        self.assertEqual(tree.avl_to_array(), items, "FAIL - from_sorted lost or reordered items")
+        self.assertEqual(tree.size(), 100, "FAIL - from_sorted size is incorrect")
+        self.assertEqual(tree.get_root().height, 6, "FAIL - from_sorted tree should have minimal height")
+        self.assertEqual(tree.max_node.key, 99, "FAIL - from_sorted max_node is incorrect")
+        self.assertEqual(tree.search(42).value, "42", "FAIL - Search in bulk built tree failed")
+        tree.insert(100, "100", "max")
+        self.assertEqual(tree.max_node.key, 100, "FAIL - Insert after from_sorted failed")
+        self.assertIsNone(AVLTree.from_sorted([]).get_root(), "FAIL - Empty from_sorted should be empty")
+
+    def test_bulk_load(self):
+        """Test building a tree from unsorted items with repeated keys."""
+        tree = AVLTree.bulk_load([(3, "c"), (1, "a"), (2, "b"), (1, "aa")])
+        self.assertEqual(tree.avl_to_array(), [(1, "aa"), (2, "b"), (3, "c")], "FAIL - bulk_load is incorrect")
+        self.assertEqual(tree.get_amir_balance_factor(), 1.0, "FAIL - bulk_load bf_zero_cnt is incorrect")
+
+    def test_join(self):
+        """Test joining two trees around a separating key."""
+        for i in range(10):
+            self.tree.insert(i, str(i))
+        other = AVLTree()
+        for i in range(20, 25):
+            other.insert(i, str(i))
+        self.tree.join(other, 15, "15")
+        expected = [(i, str(i)) for i in list(range(10)) + [15] + list(range(20, 25))]
+        self.assertEqual(self.tree.avl_to_array(), expected, "FAIL - join is incorrect")
+        self.assertEqual(self.tree.size(), 16, "FAIL - Size after join is incorrect")
+        self.assertEqual(self.tree.max_node.key, 24, "FAIL - max_node after join is incorrect")
+        self.assertEqual(other.size(), 0, "FAIL - Joined tree should be left empty")
+
+    def test_split(self):
+        """Test splitting a tree at a key."""
+        for i in range(20):
+            self.tree.insert(i, str(i))
+        left, right = self.tree.split(7)
+        self.assertEqual(left.avl_to_array(), [(i, str(i)) for i in range(7)], "FAIL - Left part of split is incorrect")
+        self.assertEqual(right.avl_to_array(), [(i, str(i)) for i in range(7, 20)], "FAIL - Right part of split is incorrect")
+        self.assertEqual((left.size(), right.size()), (7, 13), "FAIL - Sizes after split are incorrect")
+        self.assertEqual((left.max_node.key, right.max_node.key), (6, 19), "FAIL - max_node after split is incorrect")
+        self.assertIsNone(self.tree.get_root(), "FAIL - Split tree should be left empty")
+
+    def test_split_order_stats(self):
+        """Test that a split of an order_stats tree takes both counts from the joins."""
+        tree = AVLTree.from_sorted([(i, str(i)) for i in range(100)], order_stats=True)
+        for i in range(100, 130):
+            tree.insert(i, str(i), "max")
+        left, right = tree.split(37)
+        for part, size in ((left, 37), (right, 93)):
+            zeros = sum(1 for node in part.iter_nodes(part.min_node) if node.BF == 0)
+            self.assertEqual(part.size(), size, "FAIL - Size after split is incorrect")
+            self.assertEqual(part.bf_zero_cnt, zeros, "FAIL - bf_zero_cnt after split is incorrect")
+            self.assertEqual(part.select(size).key, part.max_node.key, "FAIL - Sizes after split are incorrect")
+
+    def test_rank_select(self):
+        """Test order statistics on a tree that keeps subtree sizes."""
+        tree = AVLTree(order_stats=True)
+        for i in range(0, 40, 2):
+            tree.insert(i, str(i))
+        tree.delete(tree.search(10))
+        self.assertEqual(tree.rank(12), 6, "FAIL - rank of an existing key is incorrect")
+        self.assertEqual(tree.rank(13), 6, "FAIL - rank of a missing key is incorrect")
+        self.assertEqual(tree.select(6).key, 12, "FAIL - select is incorrect")
+        self.assertIsNone(tree.select(20), "FAIL - select out of range should return None")
+        self.assertEqual(tree.count_range(5, 20), 7, "FAIL - count_range is incorrect")
+
+    def test_order_stats_on_demand(self):
+        """Test that order statistics need sizes, which enable_order_stats turns on explicitly."""
+        for i in range(10):
+            self.tree.insert(i, str(i))
+        self.assertRaises(ValueError, self.tree.rank, 4)
+        self.assertFalse(self.tree.order_stats, "FAIL - A query should not turn on order_stats")
+        self.tree.enable_order_stats()
+        self.assertEqual(self.tree.rank(4), 5, "FAIL - rank is incorrect")
+        self.tree.insert(-1, "-1")
+        self.assertEqual(self.tree.select(1).key, -1, "FAIL - sizes should be kept after enable_order_stats")
+
+    def test_iterators(self):
+        """Test the lazy in-order iterators."""
+        for i in [5, 3, 8, 1, 4, 7, 9]:
+            self.tree.insert(i, str(i))
+        self.assertEqual(list(self.tree.keys()), [1, 3, 4, 5, 7, 8, 9], "FAIL - keys is incorrect")
+        self.assertEqual(list(self.tree.items())[0], (1, "1"), "FAIL - items is incorrect")
+        self.assertEqual(list(self.tree.range(2, 7)), [(3, "3"), (4, "4"), (5, "5"), (7, "7")], "FAIL - range is incorrect")
+        self.assertEqual([k for k, v in self.tree.reversed()], [9, 8, 7, 5, 4, 3, 1], "FAIL - reversed is incorrect")
+        scan = self.tree.items()
+        self.assertEqual(next(scan), (1, "1"), "FAIL - iterators should produce items lazily")
+
+    def test_min_max_fingers(self):
+        """Test min_node, max_node and insertion from the min finger."""
+        for i in range(10, 0, -1):
+            self.tree.insert(i, str(i), "min")
+        self.assertEqual(self.tree.avl_to_array(), [(i, str(i)) for i in range(1, 11)], "FAIL - Insert from min is incorrect")
+        self.assertEqual((self.tree.min_node.key, self.tree.max_node.key), (1, 10), "FAIL - min_node or max_node is incorrect")
+        self.tree.delete(self.tree.min_node)
+        self.tree.delete(self.tree.max_node)
+        self.assertEqual((self.tree.min_node.key, self.tree.max_node.key), (2, 9), "FAIL - Fingers after delete are incorrect")
+
+    def test_successor_predecessor(self):
+        """Test the in-order threading through deletes of nodes with two children."""
+        for i in range(1, 8):
+            self.tree.insert(i, str(i))
+        node = self.tree.search(4)
+        self.assertEqual(self.tree.successor(node).key, 5, "FAIL - successor is incorrect")
+        self.assertEqual(self.tree.predecessor(node).key, 3, "FAIL - predecessor is incorrect")
+        five = self.tree.search(5)
+        self.tree.delete(node)
+        self.assertIs(self.tree.search(5), five, "FAIL - Delete should not move keys between nodes")
+        self.assertEqual(self.tree.predecessor(five).key, 3, "FAIL - predecessor after delete is incorrect")
+
+    def test_insert_many(self):
+        """Test batch insertion, both finger inserts and a merge rebuild."""
+        self.tree.insert_many([(i, str(i)) for i in range(0, 100, 2)])
+        self.tree.insert_many([(7, "7"), (3, "3"), (4, "four")])
+        expected = sorted([(i, str(i)) for i in range(0, 100, 2) if i != 4] + [(3, "3"), (4, "four"), (7, "7")])
+        self.assertEqual(self.tree.avl_to_array(), expected, "FAIL - insert_many is incorrect")
+        self.assertEqual(self.tree.size(), 52, "FAIL - Size after insert_many is incorrect")
+
+    def test_delete_many(self):
+        """Test batch deletion with keys that don't appear."""
+        for i in range(50):
+            self.tree.insert(i, str(i))
+        kept = self.tree.search(10)
+        self.tree.delete_many([5, 3, 100, 4])
+        self.assertEqual([k for k, v in self.tree.avl_to_array()], [0, 1, 2] + list(range(6, 50)), "FAIL - delete_many is incorrect")
+        self.tree.delete_many(range(20, 50))
+        self.assertEqual(self.tree.size(), 17, "FAIL - Size after delete_many is incorrect")
+        self.assertIs(self.tree.search(10), kept, "FAIL - delete_many should keep the nodes of other keys")
+
+    def test_finger_insert(self):
+        """Test that finger and auto inserts build the same tree and walk few nodes for close keys."""
+        keys = [base + offset for base in (500, 100, 900, 300) for offset in (5, 2, 7, 1, 9, 4, 3, 8, 6, 0)]
+        for start in ("finger", "auto"):
+            tree = AVLTree()
+            for key in keys:
+                tree.insert(key, str(key), start)
+            tree.delete_key(505)
+            tree.insert(505, "505", start)
+            self.assertEqual(tree.avl_to_array(), sorted((k, str(k)) for k in keys), "FAIL - Wrong tree for " + start)
+        with tree.profile() as stats:
+            tree.insert(506, "506", "finger")
+        self.assertLessEqual(stats.insert_path_length + stats.finger_walk_length, 3, "FAIL - Finger insert walked too far")
+        self.assertIs(tree.finger, tree.search(506), "FAIL - The finger is not the last inserted node")
+
+    def test_hot_key_cache(self):
+        """Test that cached searches stay correct across deletes, splits and joins."""
+        tree = AVLTree(hot_keys=2)
+        for i in range(1, 11):
+            tree.insert(i, str(i))
+        for key in (4, 4, 4, 7, 11):
+            tree.search(key)
+        self.assertEqual((tree.hot_cache.hits, tree.hot_cache.misses), (2, 3), "FAIL - Cache counters are incorrect")
+        tree.delete(tree.search(4))
+        self.assertIsNone(tree.search(4), "FAIL - A deleted key was found in the cache")
+        tree.insert(4, "four")
+        self.assertEqual(tree.search(4).value, "four", "FAIL - The cache returned a stale node")
+        tree.delete(tree.search(3)) # the successor 4 moves into the place of 3
+        self.assertEqual(tree.search(4).key, 4, "FAIL - A moved node lost its key")
+        left, right = tree.split(6)
+        self.assertIsNone(left.search(7), "FAIL - A split tree found a key of the other side")
+        self.assertEqual(right.search(7).value, "7", "FAIL - A split tree lost a key")
+        self.assertEqual(len(left.hot_cache.entries) + len(right.hot_cache.entries), 1, "FAIL - The cache kept more than the split searches")
+
+    def test_key_func(self):
+        """Test a tree of (tenant, timestamp) keys ordered through a packed int sort key."""
+        tenants = {"acme": 0, "globex": 1, "initech": 2}
+        tree = AVLTree(key_func=lambda key: tenants[key[0]] << 40 | key[1], order_stats=True)
+        keys = [(tenant, ts) for ts in (30, 10, 20) for tenant in ("initech", "acme", "globex")]
+        for key in keys:
+            tree.insert(key, str(key))
+        self.assertEqual(list(tree.keys()), sorted(keys), "FAIL - Keys are not in key_func order")
+        self.assertEqual(tree.search(("globex", 20)).value, str(("globex", 20)), "FAIL - search with key_func is incorrect")
+        self.assertEqual(tree.search(("globex", 20)).sort_key, 1 << 40 | 20, "FAIL - The sort key was not kept in the node")
+        self.assertEqual([key for key, _ in tree.range(("acme", 15), ("globex", 10))],
+                         [("acme", 20), ("acme", 30), ("globex", 10)], "FAIL - range with key_func is incorrect")
+        self.assertEqual(tree.rank(("globex", 10)), 4, "FAIL - rank with key_func is incorrect")
+        left, right = tree.split(("globex", 0))
+        self.assertEqual(right.min_node.key, ("globex", 10), "FAIL - split with key_func is incorrect")
+        left.join(right, ("acme", 40), "joined")
+        self.assertEqual(left.avl_to_array()[3], (("acme", 40), "joined"), "FAIL - join with key_func is incorrect")
+        left.delete_many([("acme", 10), ("initech", 30)])
+        self.assertEqual(left.size(), 8, "FAIL - delete_many with key_func is incorrect")
+        with self.assertRaises(ValueError):
+            left.dump(os.path.join(tempfile.mkdtemp(), "tree.avl"))
+        with self.assertRaises(ValueError):
+            DurableAVLTree(tempfile.mkdtemp(), key_func=len)
+
+    def test_delete_key_and_pop(self):
+        """Test deleting by key and popping from both ends."""
+        for i in [5, 2, 8, 1, 9, 3]:
+            self.tree.insert(i, str(i))
+        self.tree.delete_key(5)
+        self.tree.delete_key(7)
+        self.assertIsNone(self.tree.search(5), "FAIL - delete_key did not delete")
+        self.assertEqual(self.tree.pop_min(), (1, "1"), "FAIL - pop_min is incorrect")
+        self.assertEqual(self.tree.pop_max(), (9, "9"), "FAIL - pop_max is incorrect")
+        self.assertEqual(self.tree.avl_to_array(), [(2, "2"), (3, "3"), (8, "8")], "FAIL - Items after pops are incorrect")
+        for _ in range(3):
+            self.tree.pop_max()
+        self.assertIsNone(self.tree.pop_min(), "FAIL - pop_min of an empty tree should return None")
+
+    def test_profile(self):
+        """Test the opt-in operation counters."""
+        self.tree.insert(1, "1")
+        with self.tree.profile() as stats:
+            self.tree.insert(2, "2")
+            self.tree.insert(3, "3") # single rotation
+            self.tree.insert(5, "5")
+            self.tree.insert(4, "4") # double rotation
+            self.tree.search(4)
+        self.assertIsNone(self.tree.stats, "FAIL - Profiling should stop after the with block")
+        self.assertEqual((stats.single_rotations, stats.double_rotations), (1, 1), "FAIL - Rotation counters are incorrect")
+        self.assertEqual((stats.inserts, stats.node_allocations, stats.searches), (4, 4, 1), "FAIL - Operation counters are incorrect")
+        self.assertEqual(stats.search_path_length, 2, "FAIL - Search path length is incorrect")
+
+    def test_dump_and_load(self):
+        """Test that a dumped tree loads back with the same items, for int, str and other keys and values."""
+        path = os.path.join(tempfile.mkdtemp(), "tree.avl")
+        for items in ([(i, str(i)) for i in range(-50, 50)], [(str(i), i) for i in range(100)],
+                      [((i % 3, i / 2), i) for i in range(100)], [(2 ** 70 * i, str(i)) for i in range(-5, 5)],
+                      [("\udc80" + str(i), "\udc81") for i in range(10)], [(i, "\udc80") for i in range(10)]):
+            tree = AVLTree.bulk_load(items)
+            tree.dump(path)
+            loaded = AVLTree.load(path, order_stats=True)
+            self.assertEqual(loaded.avl_to_array(), tree.avl_to_array(), "FAIL - Loaded tree is different")
+            self.assertEqual(loaded.get_root().height, tree.get_root().height, "FAIL - Loaded tree is not balanced")
+            self.assertEqual(loaded.select(1).key, tree.min_node.key, "FAIL - Sizes were not rebuilt")
+        os.remove(path)
+
+    def test_mapped_tree(self):
+        """Test that a memory-mapped dump answers searches and range queries."""
+        path = os.path.join(tempfile.mkdtemp(), "tree.avl")
+        AVLTree.from_sorted([(2 * i, str(i)) for i in range(100)]).dump(path)
+        with MappedAVLTree(path) as tree:
+            self.assertEqual(tree.size(), 100, "FAIL - Wrong size")
+            self.assertEqual(tree.search(42).value, "21", "FAIL - Search failed")
+            self.assertIsNone(tree.search(43), "FAIL - Search found a missing key")
+            self.assertEqual(list(tree.range(11, 17)), [(12, "6"), (14, "7"), (16, "8")], "FAIL - Wrong range")
+            self.assertEqual(tree.avl_to_array(), [(2 * i, str(i)) for i in range(100)], "FAIL - Wrong export")
+        AVLTree.from_sorted([(2 ** 70 + i, "\udc80") for i in range(10)]).dump(path)
+        with MappedAVLTree(path) as tree:
+            self.assertEqual(tree.search(2 ** 70 + 3).value, "\udc80", "FAIL - Search of a pickled column failed")
+        os.remove(path)
+
+    def test_range_aggregate(self):
+        """Test that subtree aggregates stay correct through inserts, deletes and updates."""
+        tree = AVLTree(aggregate=product(SUM, MAX))
+        for i in range(100):
+            tree.insert(i, i * i % 37)
+        for i in range(0, 100, 3):
+            tree.delete_key(i)
+        tree.insert(50, 1000)
+        items = dict(tree.items())
+        for lo, hi in ((0, 99), (10, 20), (49, 51), (60, 59)):
+            values = [v for k, v in items.items() if lo <= k <= hi]
+            self.assertEqual(tree.range_aggregate(lo, hi), (sum(values), max(values, default=float("-inf"))),
+                             "FAIL - Wrong aggregate of [%d, %d]" % (lo, hi))
+        self.assertRaises(ValueError, self.tree.range_aggregate, 0, 1)
+
+    def test_interval_tree(self):
+        """Test interval overlap and stabbing queries."""
+        intervals = IntervalTree()
+        for start, end in ((1, 5), (2, 3), (4, 10), (8, 9), (12, 15), (20, 30)):
+            intervals.insert(start, end, "%d-%d" % (start, end))
+        self.assertEqual([v for s, e, v in intervals.overlap(5, 8)], ["1-5", "4-10", "8-9"], "FAIL - Wrong overlap")
+        self.assertEqual([v for s, e, v in intervals.stab(3)], ["1-5", "2-3"], "FAIL - Wrong stab")
+        intervals.delete(4, 10)
+        self.assertEqual(list(intervals.stab(7)), [], "FAIL - Deleted interval was found")
+        self.assertEqual(list(intervals.overlap(16, 19)), [], "FAIL - Found an interval in a gap")
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_numpy_bridge(self):
+        """Test bulk search, export and construction through NumPy arrays."""
+        tree = AVLTree.from_numpy(numpy.array([5, 1, 3, 1]), numpy.array([50, 10, 30, 11]))
+        self.assertEqual(tree.avl_to_array(), [(1, 11), (3, 30), (5, 50)], "FAIL - Wrong tree from arrays")
+        found, values = tree.search_many(numpy.array([0, 1, 3, 4, 5, 6]), default=-1)
+        self.assertEqual(found.tolist(), [False, True, True, False, True, False], "FAIL - Wrong found mask")
+        self.assertEqual(values.tolist(), [-1, 11, 30, -1, 50, -1], "FAIL - Wrong values")
+
+        keys, values = tree.to_numpy()
+        self.assertIs(tree.to_numpy()[0], keys, "FAIL - The snapshot was not reused")
+        tree.insert(2, 20)
+        self.assertEqual(tree.to_numpy()[0].tolist(), [1, 2, 3, 5], "FAIL - The snapshot was not invalidated")
+        tree.delete_key(1)
+        self.assertEqual(tree.search_many([1, 2])[0].tolist(), [False, True], "FAIL - Stale snapshot after delete")
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_numpy_mixed_keys(self):
+        """Test that mixed int, float and bool keys are compared exactly, not through a common dtype."""
+        tree = AVLTree.from_sorted([(0.5, "half"), (2 ** 60, "a"), (2 ** 60 + 1, "b")])
+        self.assertEqual(tree.search_many([2 ** 60 + 1])[1].tolist(), ["b"], "FAIL - Keys were coerced to float")
+        self.assertEqual(tree.search_many(numpy.array([2 ** 60 + 1]))[1].tolist(), ["b"], "FAIL - Queries were coerced")
+        self.assertEqual(tree.to_numpy()[0].tolist(), [0.5, 2 ** 60, 2 ** 60 + 1], "FAIL - Keys were coerced")
+
+        tree = AVLTree.from_sorted([(False, "no"), (2, "two")])
+        self.assertIs(tree.to_numpy()[0][0], False, "FAIL - A bool key was turned into an int")
+        tree = AVLTree.from_sorted([(1, "one"), (2 ** 70, "big")])
+        self.assertEqual(tree.search_many([2 ** 70, 3])[0].tolist(), [True, False], "FAIL - Wrong mask for big ints")
+        tree = AVLTree.from_numpy([2 ** 60 + 1, 0.5, 2 ** 60], ["b", "half", "a"])
+        self.assertEqual(tree.search(2 ** 60 + 1).value, "b", "FAIL - from_numpy coerced the keys")
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_numpy_object_values(self):
+        """Test that mixed, tuple and ragged values and tuple keys keep their types through NumPy."""
+        items = [(1, 10), (2, "two"), (3, (3, 4)), (4, [1, 2, 3]), (5, (5, 6))]
+        tree = AVLTree.from_sorted(items)
+        keys, values = tree.to_numpy()
+        self.assertEqual(values.shape, (5,), "FAIL - Values were split into rows")
+        self.assertEqual(list(zip(keys.tolist(), values.tolist())), items, "FAIL - Values were coerced")
+        self.assertEqual(tree.search_many([2, 5])[1].tolist(), ["two", (5, 6)], "FAIL - Wrong values")
+
+        tree = AVLTree.from_numpy(numpy.array([3, 1, 2]), [(3, 0), 1.5, "b"])
+        self.assertEqual(tree.avl_to_array(), [(1, 1.5), (2, "b"), (3, (3, 0))], "FAIL - Wrong tree from arrays")
+
+        tree = AVLTree.from_sorted([((0, 1), "a"), ((1, 0), "b")])
+        found, values = tree.search_many([(1, 0), (2, 2)])
+        self.assertEqual(found.tolist(), [True, False], "FAIL - Wrong found mask for tuple keys")
+        self.assertEqual(values[0], "b", "FAIL - Wrong value for a tuple key")
+
+class DurableAVLTester(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def test_recovery_from_log(self):
+        """Test that committed writes are replayed after a restart, and a torn record is dropped."""
+        tree = DurableAVLTree(self.directory, group_size=8, checkpoint_every=0)
+        for i in range(20):
+            tree.insert(i, str(i))
+        tree.delete_key(5)
+        tree.insert(3, "three")
+        tree.close()
+        with open(tree.log_path, "ab") as log:
+            log.write(b"\x01\xff")
+
+        recovered = DurableAVLTree(self.directory, checkpoint_every=0)
+        expected = [(i, "three" if i == 3 else str(i)) for i in range(20) if i != 5]
+        self.assertEqual(recovered.avl_to_array(), expected, "FAIL - Log replay is wrong")
+        recovered.insert(100, "100")
+        recovered.close()
+        self.assertEqual(DurableAVLTree(self.directory).search(100).value, "100", "FAIL - Torn record was not dropped")
+
+    def test_checkpoint(self):
+        """Test that checkpoints empty the log and restore the tree."""
+        tree = DurableAVLTree(self.directory, group_size=10, checkpoint_every=50)
+        tree.insert_many((i, str(i)) for i in range(120))
+        tree.delete_key(7)
+        tree.close()
+        self.assertTrue(os.path.exists(tree.checkpoint_path), "FAIL - No checkpoint was taken")
+        self.assertLess(os.path.getsize(tree.log_path), 1000, "FAIL - The log was not emptied")
+        recovered = DurableAVLTree(self.directory)
+        self.assertEqual(recovered.avl_to_array(), [(i, str(i)) for i in range(120) if i != 7],
+                         "FAIL - Checkpoint recovery is wrong")
+        recovered.close()
+
+    def test_any_key_checkpoint(self):
+        """Test that trees with tuple, float, bool and big int keys checkpoint and recover."""
+        for keys in ([(i % 4, str(i)) for i in range(60)], [i / 4 for i in range(60)], [False, True],
+                     [2 ** 70 * i for i in range(-30, 30)]):
+            directory = tempfile.mkdtemp()
+            tree = DurableAVLTree(directory, group_size=1, checkpoint_every=len(keys) // 2)
+            for key in keys:
+                tree.insert(key, repr(key))
+            tree.close()
+            self.assertTrue(os.path.exists(tree.checkpoint_path), "FAIL - No checkpoint was taken")
+            with DurableAVLTree(directory) as recovered:
+                self.assertEqual(recovered.avl_to_array(), sorted((key, repr(key)) for key in keys),
+                                 "FAIL - Checkpoint recovery is wrong")
+
+    def test_failed_checkpoint(self):
+        """Test that a failed checkpoint keeps the log and doesn't fail the write."""
+        tree = DurableAVLTree(self.directory, sync="always", checkpoint_every=2)
+        os.mkdir(tree.checkpoint_path + ".tmp") # The dump can't be written
+        for i in range(5):
+            tree.insert(i, str(i))
+        self.assertIsInstance(tree.checkpoint_error, OSError, "FAIL - The checkpoint error was not kept")
+        self.assertFalse(os.path.exists(tree.checkpoint_path), "FAIL - A checkpoint was taken")
+        os.rmdir(tree.checkpoint_path + ".tmp")
+        for i in range(5, 8):
+            tree.insert(i, str(i))
+        self.assertIsNone(tree.checkpoint_error, "FAIL - The checkpoint was not retried")
+        self.assertTrue(os.path.exists(tree.checkpoint_path), "FAIL - No checkpoint was taken")
+        tree.insert(8, "8")
+        tree.close()
+        with DurableAVLTree(self.directory) as recovered:
+            self.assertEqual(recovered.avl_to_array(), [(i, str(i)) for i in range(9)], "FAIL - Writes were lost")
+
+    def test_refused_write_is_not_logged(self):
+        """Test that a write the tree refuses leaves no record behind, buffered or written."""
+        for group_size in (1, 8):
+            directory = tempfile.mkdtemp()
+            tree = DurableAVLTree(directory, group_size=group_size, checkpoint_every=0)
+            tree.insert_many((i, str(i)) for i in range(10))
+            with self.assertRaises(TypeError):
+                tree.insert("ten", "10")
+            tree.insert(10, "10")
+            tree.close()
+            with DurableAVLTree(directory) as recovered:
+                self.assertEqual(recovered.avl_to_array(), [(i, str(i)) for i in range(11)],
+                                 "FAIL - A refused write was replayed")
+
+class AVLCacheTester(unittest.TestCase):
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted first."""
+        cache = AVLCache(capacity=3)
+        for key in "abc":
+            cache.set(key, key.upper())
+        self.assertEqual(cache.get("a"), "A", "FAIL - Get failed")
+        cache.set("d", "D")
+        self.assertNotIn("b", cache, "FAIL - The least recently used entry was not evicted")
+        self.assertEqual(sorted(cache.entries), ["a", "c", "d"], "FAIL - Wrong entries")
+        self.assertIsNone(cache.get("b"), "FAIL - Evicted entry was found")
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["evictions"]), (1, 1, 1), "FAIL - Wrong stats")
+
+    def test_ttl(self):
+        """Test that entries expire after their ttl and touch refreshes it."""
+        now = [0.0]
+        cache = AVLCache(ttl=10, clock=lambda: now[0])
+        for i in range(5):
+            now[0] = i
+            cache.set(i, str(i))
+        cache.touch(0)
+        now[0] = 12.5
+        self.assertEqual(cache.expire(), 2, "FAIL - Wrong number of expired entries")
+        self.assertEqual(sorted(cache.entries), [0, 3, 4], "FAIL - Wrong entries after expiry")
+        now[0] = 13
+        self.assertIsNone(cache.get(3), "FAIL - Expired entry was returned")
+        self.assertEqual(len(cache), 2, "FAIL - Wrong size")
+
+    def test_touch_expired(self):
+        """Test that touch doesn't bring back an expired entry."""
+        now = [0.0]
+        cache = AVLCache(ttl=10, clock=lambda: now[0])
+        cache.set("a", "A")
+        now[0] = 11
+        self.assertFalse(cache.touch("a"), "FAIL - An expired entry was touched")
+        self.assertNotIn("a", cache, "FAIL - An expired entry came back")
+        self.assertIsNone(cache.get("a"), "FAIL - An expired entry was returned")
+        self.assertEqual((len(cache), cache.expirations), (0, 1), "FAIL - The expired entry was not removed")
+
+class TreeEnginesTester(unittest.TestCase):
+
+    def test_same_api(self):
+        """Test that every engine behaves like a dictionary through the AVLTree API."""
+        keys = [(i * 37) % 101 for i in range(101)]
+        for engine in ENGINES:
+            tree = make_tree(engine, fanout=4) if engine == "btree" else make_tree(engine)
+            for key in keys:
+                tree.insert(key, str(key))
+            for key in range(0, 101, 2):
+                tree.delete(tree.search(key))
+            expected = [(key, str(key)) for key in range(1, 101, 2)]
+            self.assertEqual(tree.avl_to_array(), expected, "FAIL - Wrong items in " + engine)
+            self.assertEqual(tree.size(), 50, "FAIL - Wrong size in " + engine)
+            self.assertEqual(tree.max_node.key, 99, "FAIL - Wrong max in " + engine)
+            self.assertIsNone(tree.search(50), "FAIL - Deleted key found in " + engine)
+            self.assertEqual(tree.search(51).value, "51", "FAIL - Search failed in " + engine)
+            self.assertIsNotNone(tree.get_root(), "FAIL - No root in " + engine)
+
+    def test_array_backend(self):
+        """Test that the column backend rotates exactly like AVLTree."""
+        rng = random.Random(5)
+        tree, columns = AVLTree(), ArrayAVLTree()
+        for _ in range(2000):
+            key = rng.randrange(300)
+            if rng.random() < 0.6:
+                self.assertEqual(columns.insert(key, str(key)), tree.insert(key, str(key)), "FAIL - Different insert counts")
+            elif tree.search(key) is not None:
+                self.assertEqual(columns.delete(columns.search(key)), tree.delete(tree.search(key)), "FAIL - Different delete counts")
+
+        def shape(node):
+            return None if node is None or not node.is_real_node() else (node.key, node.height, shape(node.left), shape(node.right))
+        self.assertEqual(columns.avl_to_array(), tree.avl_to_array(), "FAIL - Different items")
+        self.assertEqual(columns.get_root().key, tree.get_root().key, "FAIL - Different roots")
+        self.assertEqual(columns.get_root().height, tree.get_root().height, "FAIL - Different heights")
+        self.assertLessEqual(len(columns.keys), 300, "FAIL - Deleted handles were not reused")
+
+    def test_unknown_engine(self):
+        """Test that an unknown engine name is rejected."""
+        self.assertRaises(ValueError, make_tree, "splay")
+
+class PersistentAVLTester(unittest.TestCase):
+
+    def test_versions(self):
+        """Test that updates return new versions and keep the old ones intact."""
+        v1 = PersistentAVLTree()
+        for i in range(10):
+            v1 = v1.insert(i, str(i))
+        v2 = v1.insert(10, "10").delete(3)
+        self.assertEqual(v1.size(), 10, "FAIL - Old version changed size")
+        self.assertEqual(v1.search(3).value, "3", "FAIL - Old version lost a key")
+        self.assertIsNone(v2.search(3), "FAIL - New version should not have key 3")
+        self.assertEqual([k for k, v in v2.avl_to_array()], [0, 1, 2, 4, 5, 6, 7, 8, 9, 10], "FAIL - New version is incorrect")
+        self.assertIs(v2.delete(42), v2, "FAIL - Deleting a missing key should return the same version")
+
+    def test_path_copying(self):
+        """Test that an insert shares the subtrees off the search path."""
+        v1 = PersistentAVLTree.from_sorted([(i, str(i)) for i in range(15)])
+        v2 = v1.insert(100, "100")
+        self.assertIsNot(v1.get_root(), v2.get_root(), "FAIL - The root should be copied")
+        self.assertIs(v1.get_root().left, v2.get_root().left, "FAIL - The left subtree should be shared")
+
+class ConcurrentAVLTester(unittest.TestCase):
+
+    def test_queued_writes(self):
+        """Test that queued writes become visible after flush."""
+        tree = ConcurrentAVLTree(max_batch=16)
+        for i in range(100):
+            tree.submit_insert(i, str(i))
+        tree.submit_delete(50)
+        tree.flush()
+        self.assertEqual(tree.size(), 99, "FAIL - Queued writes were not applied")
+        self.assertIsNone(tree.search(50), "FAIL - Queued delete was not applied")
+        tree.close()
+
+    def test_failed_queued_write(self):
+        """Test that a queued write that raises is reported and doesn't stop the writer."""
+        tree = ConcurrentAVLTree()
+        tree.submit_insert(1, "1")
+        tree.submit_insert("x", "x") # not comparable with int keys
+        tree.submit_insert(2, "2")
+        self.assertRaises(TypeError, tree.flush)
+        self.assertEqual(tree.avl_to_array(), [(1, "1"), (2, "2")], "FAIL - The other queued writes were lost")
+        tree.submit_insert(3, "3")
+        tree.flush()
+        self.assertEqual(tree.size(), 3, "FAIL - The writer thread stopped after an error")
+        failed = []
+        tree = ConcurrentAVLTree(on_error=lambda op, error: failed.append(op))
+        tree.submit_insert(1, "1")
+        tree.submit_delete("x")
+        tree.flush()
+        tree.close()
+        self.assertEqual(failed, [("delete", "x", None)], "FAIL - on_error was not called")
+
+    def test_readers_see_consistent_versions(self):
+        """Test that readers running next to a writer only see complete versions."""
+        tree = ConcurrentAVLTree()
+        done = threading.Event()
+        errors = []
+
+        def reader():
+            while not done.is_set():
+                keys = [k for k, v in tree.snapshot().avl_to_array()]
+                if keys != list(range(len(keys))):
+                    errors.append(keys)
+
+        readers = [threading.Thread(target=reader) for _ in range(3)]
+        for thread in readers:
+            thread.start()
+        for i in range(300):
+            tree.insert(i, str(i))
+        done.set()
+        for thread in readers:
+            thread.join()
+        self.assertEqual(errors, [], "FAIL - A reader saw a partial version")
+
+class ShardedAVLTester(unittest.TestCase):
+
+    def test_bulk_build_and_range(self):
+        """Test that a bulk built sharded tree answers point and range queries."""
+        tree = ShardedAVLTree.bulk_build([(i, str(i)) for i in reversed(range(1000))], shards=4, processes=1)
+        self.assertEqual(len(tree.shards), 4, "FAIL - Wrong number of shards")
+        self.assertEqual(tree.avl_to_array(), [(i, str(i)) for i in range(1000)], "FAIL - Wrong export")
+        self.assertEqual(tree.search(500).value, "500", "FAIL - Search failed")
+        self.assertEqual(list(tree.range(240, 260)), [(i, str(i)) for i in range(240, 261)], "FAIL - Wrong range")
+        self.assertEqual(tree.count_range(100, 899), 800, "FAIL - Wrong range count")
+        tree.delete(500)
+        self.assertIsNone(tree.search(500), "FAIL - Delete failed")
+
+    def test_rebalance(self):
+        """Test that inserts into one shard spread over the shards again."""
+        tree = ShardedAVLTree([100, 200, 300], processes=1)
+        tree.insert_many((i, str(i)) for i in range(1000, 2000))
+        self.assertEqual(tree.avl_to_array(), [(i, str(i)) for i in range(1000, 2000)], "FAIL - Items were lost")
+        self.assertEqual([shard.size() for shard in tree.shards], [250] * 4, "FAIL - Shards were not rebalanced")
+        for i in range(2000, 3000):
+            tree.insert(i, str(i))
+        self.assertLessEqual(max(shard.size() for shard in tree.shards), 2 * tree.size() / 4 + 1,
+                             "FAIL - Shards are skewed")
+        self.assertEqual([k for k, v in tree.avl_to_array()], list(range(1000, 3000)), "FAIL - Items were lost")
+
+    def test_few_items_keep_the_shards(self):
+        """Test that fewer items than shards don't merge shards away for good."""
+        tree = ShardedAVLTree([100 * i for i in range(1, 8)], processes=1)
+        for i in range(3):
+            tree.insert(i, str(i))
+        self.assertEqual(len(tree.shards), 8, "FAIL - Shards were dropped")
+        self.assertEqual(tree.size(), 3, "FAIL - Wrong size")
+        for i in range(3, 40):
+            tree.insert(i, str(i))
+        tree.delete(5)
+        self.assertEqual(len(tree.shards), 8, "FAIL - Shards were dropped")
+        self.assertEqual(tree.size(), 39, "FAIL - Wrong size after delete")
+        self.assertLessEqual(max(shard.size() for shard in tree.shards), 2 * 39 / 8 + 1, "FAIL - Shards are skewed")
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -5,6 +5,9 @@
 #id2      - 325162782
 #name2    - Yael Sarne 
 
+from collections import deque
+from contextlib import contextmanager
+
 """A class represnting a node in an AVL tree"""
 class AVLNode(object):
     """Constructor, you are allowed to add more fields. 
@@ -13,16 +16,25 @@ class AVLNode(object):
     @param key: key of your node
     @type value: string
     @param value: data of your node
+    @param sort_key: what the tree compares instead of key, key itself if None
     """
-    def __init__(self, key=None, value=None):
+    __slots__ = ("key", "value", "sort_key", "parent", "height", "BF", "left", "right", "size", "zeros", "agg", "prev", "next")
+
+    def __init__(self, key=None, value=None, sort_key=None):
         self.key = key
         self.value = value
+        self.sort_key = key if sort_key is None else sort_key
         self.parent = None
         self.height = -1 if key is None else 0 
         self.BF = 0
+        self.size = 0 if key is None else 1 # Subtree size, kept only by order_stats trees
+        self.zeros = 0 if key is None else 1 # BF 0 nodes in the subtree, kept only by order_stats trees
+        self.agg = None # Subtree aggregate, kept only by trees with an aggregate
+        self.prev = None # In-order predecessor
+        self.next = None # In-order successor
         if key is not None:
-            self.left = AVLNode() # Virtual child
-            self.right = AVLNode() # Virtual child
+            self.left = VIRTUAL_NODE # Shared virtual child
+            self.right = VIRTUAL_NODE # Shared virtual child
         else:
             self.left = None 
             self.right = None 
@@ -42,6 +54,157 @@ class AVLNode(object):
         return self.key is not None
 
 
+class _VirtualNode(AVLNode):
+    """The virtual leaf shared by every real node of every tree.
+
+    Real nodes point at it instead of owning two virtual children, so a tree of
+    n keys holds n node objects rather than about 3n. It is never written to.
+    """
+    __slots__ = ()
+
+    def __init__(self):
+        for name, val in (("key", None), ("value", None), ("sort_key", None), ("parent", None),
+                          ("height", -1), ("BF", 0), ("left", None), ("right", None),
+                          ("size", 0), ("zeros", 0), ("agg", None), ("prev", None), ("next", None)):
+            object.__setattr__(self, name, val)
+
+    def __setattr__(self, name, val):
+        raise AttributeError("the shared virtual node is read-only")
+
+
+VIRTUAL_NODE = _VirtualNode()
+
+# insert_many and delete_many rebuild the whole tree in O(n + m) when the batch has at
+# least 1/BATCH_REBUILD_RATIO as many keys as the tree, instead of one finger walk per key
+BATCH_REBUILD_RATIO = 4
+
+# insert(start="auto") uses the finger while its climbs stay under half the height of the
+# tree, and after a longer one starts from the root for this many inserts
+FINGER_BACKOFF = 16
+
+
+class Monoid(object):
+    """An aggregate an AVLTree can keep in every node for its whole subtree.
+
+    combine must be associative and identity must be its neutral element. measure
+    gives the contribution of a single item. The aggregate of a subtree is the
+    combination of the measures of its items in key order.
+    """
+
+    def __init__(self, combine, identity, measure=None):
+        self.combine = combine
+        self.identity = identity
+        self.measure = measure if measure is not None else (lambda key, value: value)
+
+
+SUM = Monoid(lambda a, b: a + b, 0)
+MIN = Monoid(min, float("inf"))
+MAX = Monoid(max, float("-inf"))
+
+
+def product(*monoids):
+    """Returns a monoid keeping the aggregates of all of monoids at once, as a tuple."""
+    return Monoid(lambda a, b: tuple(m.combine(x, y) for m, x, y in zip(monoids, a, b)),
+                  tuple(m.identity for m in monoids),
+                  lambda key, value: tuple(m.measure(key, value) for m in monoids))
+
+
+class AVLStats(object):
+    """Opt-in counters for the hot paths of an AVLTree.
+
+    Attach one with tree.stats = AVLStats() or for a block with `with tree.profile() as stats:`.
+    A tree without stats only pays one `is not None` test per operation.
+
+    @type on_operation: callable or None
+    @param on_operation: called as on_operation(op, rebalance_ops, path_length) after every
+    insert and delete, so a profiler can catch single slow operations
+    """
+    COUNTERS = ("inserts", "deletes", "searches", "single_rotations", "double_rotations",
+                "height_fixes", "search_path_length", "insert_path_length",
+                "finger_walk_length", "node_allocations", "max_rebalance_ops", "max_path_length")
+
+    def __init__(self, on_operation=None):
+        for name in self.COUNTERS:
+            setattr(self, name, 0)
+        self.on_operation = on_operation
+
+    def __repr__(self):
+        return "AVLStats(%s)" % ", ".join("%s=%d" % item for item in self.as_dict().items())
+
+    def as_dict(self):
+        """Returns the counters as a dict."""
+        return {name: getattr(self, name) for name in self.COUNTERS}
+
+    def record_operation(self, op, rebalance_ops, path_length):
+        """Counts one finished insert or delete."""
+        if op == "insert":
+            self.inserts += 1
+        else:
+            self.deletes += 1
+        self.max_rebalance_ops = max(self.max_rebalance_ops, rebalance_ops)
+        self.max_path_length = max(self.max_path_length, path_length)
+        if self.on_operation is not None:
+            self.on_operation(op, rebalance_ops, path_length)
+
+
+class HotKeyCache(object):
+    """A bounded map from recently found keys to their nodes, checked by AVLTree.search first.
+
+    Eviction is CLOCK (second chance): a hit only marks its key as referenced, and the
+    oldest key of the ring is evicted unless it was referenced since it was last passed
+    over, in which case it goes to the back of the ring instead. Hits reorder nothing,
+    unlike LRU, so a hit is a dict lookup and a set insert.
+
+    A node keeps its key for as long as it is in the tree, so an entry only goes stale when
+    its node is deleted; AVLTree.delete drops it then, and operations that move many nodes
+    at once (rebuild, split, join) clear the cache.
+
+    @type capacity: int
+    @param capacity: the most keys kept
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.entries = {}
+        self.referenced = set()
+        self.ring = deque() # Keys oldest first, may hold discarded keys and repeats
+        self.hits = self.misses = 0
+
+    def __repr__(self):
+        return "HotKeyCache(%s)" % ", ".join("%s=%s" % item for item in self.as_dict().items())
+
+    def as_dict(self):
+        """Returns the counters as a dict."""
+        lookups = self.hits + self.misses
+        return dict(capacity=self.capacity, size=len(self.entries), hits=self.hits, misses=self.misses,
+                    hit_rate=self.hits / lookups if lookups else 0.0)
+
+    def put(self, key, node):
+        entries, referenced, ring = self.entries, self.referenced, self.ring
+        while len(entries) >= self.capacity:
+            old_key = ring.popleft()
+            if old_key not in entries:
+                continue
+            if old_key in referenced:
+                referenced.discard(old_key)
+                ring.append(old_key)
+            else:
+                del entries[old_key]
+        entries[key] = node
+        ring.append(key)
+        if len(ring) > 2 * self.capacity:
+            self.ring = deque(dict.fromkeys(key for key in ring if key in entries))
+
+    def discard(self, key):
+        self.entries.pop(key, None)
+        self.referenced.discard(key)
+
+    def clear(self):
+        self.entries.clear()
+        self.referenced.clear()
+        self.ring.clear()
+
+
 """
 A class implementing an AVL tree.
 """
@@ -49,12 +212,74 @@ class AVLTree(object):
 
     """
     Constructor, you are allowed to add more fields.  
+
+    Every node has the fields of all the options, whether the tree uses them or not:
+    sort_key (key_func), size and zeros (order_stats), agg (aggregate), and prev and next
+    (the in-order threads behind min_node, the iterators and finger inserts). That is 13
+    slots, 136 bytes a node on 64-bit CPython against 88 for the 7 fields of the baseline
+    node. It keeps the node layout the same for all trees, so enable_order_stats works in
+    place without invalidating nodes already handed out, and trees with different options
+    can be joined. AVLBenchmark reports the layout in its "node" record. Where memory per
+    key matters most, ArrayAVLTree stores a key in about 30 bytes.
+
+    @type order_stats: bool
+    @param order_stats: keep subtree sizes in the nodes, for rank, select and count_range
+    @type aggregate: Monoid
+    @param aggregate: keep this aggregate of every subtree in its root, for range_aggregate
+    @type hot_keys: int
+    @param hot_keys: cache the nodes of up to this many recently searched keys, 0 for no cache.
+    Pays off when a few keys get most lookups, a miss costs more than a plain search
+    @type key_func: callable
+    @param key_func: order the keys by key_func(key), like the key of sorted. It is called once
+    per inserted key and its result is kept in the node, so the tree compares it directly
     """
-    def __init__(self):
+    def __init__(self, order_stats=False, aggregate=None, hot_keys=0, key_func=None):
         self.root = None
         self.max_node = None 
+        self.min_node = None
         self._size = 0 
         self.bf_zero_cnt = 0 
+        self.order_stats = order_stats
+        self.aggregate = aggregate
+        self.stats = None # AVLStats, when the tree is profiled
+        self.hot_cache = HotKeyCache(hot_keys) if hot_keys else None
+        self.key_func = key_func
+        self.version = 0 # Bumped by every change, invalidates array_snapshot
+        self.finger = None # The node of the last insert or delete, for insert(start="finger")
+        self.finger_score = 0 # Negative while insert(start="auto") avoids the finger
+        self.array_snapshot = None # (version, keys, values) NumPy columns, see AVLNumpy
+
+
+    def new_tree(self):
+        """Returns an empty tree with the same options as self."""
+        return self.__class__(order_stats=self.order_stats, aggregate=self.aggregate,
+                              hot_keys=self.hot_cache.capacity if self.hot_cache is not None else 0,
+                              key_func=self.key_func)
+
+
+    def sort_key_of(self, key):
+        """Returns what the tree compares for key."""
+        return key if self.key_func is None else self.key_func(key)
+
+
+    @contextmanager
+    def profile(self, on_operation=None):
+        """Counts the work of the tree inside a with block, yields the AVLStats."""
+        previous, self.stats = self.stats, AVLStats(on_operation)
+        try:
+            yield self.stats
+        finally:
+            self.stats = previous
+
+
+    def path_length(self, top, node):
+        """Returns the number of nodes on the path from top down to node."""
+        length = 1
+        while node is not top:
+            node = node.parent
+            length += 1
+        return length
+
 
     def __repr__(self):  # you don't need to understand the implementation of this method
         def printree(root):
@@ -106,10 +331,38 @@ class AVLTree(object):
         
         node.height = 1 + max(left_h, right_h)
         node.BF = left_h - right_h
+        if self.order_stats:
+            node.size = 1 + node.left.size + node.right.size
+            node.zeros = (node.BF == 0) + node.left.zeros + node.right.zeros
+        if self.aggregate is not None:
+            node.agg = self.node_aggregate(node)
         
         self.update_zero_count(old_bf, node.BF)
 
 
+    def node_aggregate(self, node):
+        """Returns the aggregate of the subtree of node, from the aggregates of its children."""
+        aggregate = self.aggregate
+        agg = aggregate.measure(node.key, node.value)
+        if node.left is not VIRTUAL_NODE:
+            agg = aggregate.combine(node.left.agg, agg)
+        if node.right is not VIRTUAL_NODE:
+            agg = aggregate.combine(agg, node.right.agg)
+        return agg
+
+
+    def fix_upward(self, node):
+        """Recomputes subtree sizes, zero counts and aggregates from node up to the root, for order_stats and aggregate trees."""
+        order_stats, aggregate = self.order_stats, self.aggregate is not None
+        while node is not None:
+            if order_stats:
+                node.size = 1 + node.left.size + node.right.size
+                node.zeros = (node.BF == 0) + node.left.zeros + node.right.zeros
+            if aggregate:
+                node.agg = self.node_aggregate(node)
+            node = node.parent
+
+
     def update_zero_count(self, old_bf, new_bf):
         """Updates the count of nodes with BF = 0."""
         if old_bf == 0 and new_bf != 0:
@@ -171,14 +424,65 @@ class AVLTree(object):
     """
     def search(self, key):
         node = self.root
-        while node is not None and node.is_real_node():
-            if key == node.key:
+        if node is None:
+            return None
+        if self.key_func is not None:
+            key = self.key_func(key)
+        if self.stats is not None:
+            return self.search_counted(key)
+        cache = self.hot_cache
+        if cache is not None:
+            found = cache.entries.get(key)
+            if found is None:
+                return self.search_cached(key)
+            cache.hits += 1
+            cache.referenced.add(key)
+            return found
+        # Hot loop: compare against the shared virtual node instead of calling
+        # is_real_node(), and test equality last since most levels don't match
+        virtual = VIRTUAL_NODE
+        while node is not virtual:
+            node_key = node.sort_key
+            if key < node_key:
+                node = node.left
+            elif node_key < key:
+                node = node.right
+            else:
                 return node 
-            elif key < node.key:
+        return None # Key not found
+
+
+    def search_counted(self, key):
+        """search() for a profiled tree, which also counts the path length."""
+        self.stats.searches += 1
+        node = self.root
+        while node.is_real_node():
+            self.stats.search_path_length += 1
+            if key < node.sort_key:
                 node = node.left
+            elif node.sort_key < key:
+                node = node.right
             else:
+                return node
+        return None
+
+
+    def search_cached(self, key):
+        """search() for a key missing from the hot key cache, which caches the node found."""
+        cache = self.hot_cache
+        cache.misses += 1
+        node = self.root
+        virtual = VIRTUAL_NODE
+        while node is not virtual:
+            node_key = node.sort_key
+            if key < node_key:
+                node = node.left
+            elif node_key < key:
                 node = node.right
-        return None # Key not found
+            else:
+                cache.put(key, node)
+                return node
+        return None
 
 
     """inserts a new node into the dictionary with corresponding key and value
@@ -188,69 +492,181 @@ class AVLTree(object):
     @param key: key of item that is to be inserted to self
     @type val: string
     @param val: the value of the item
-    @param start: can be either "root" or "max"
+    @param start: can be either "root", "max", "min", "finger" (the node of the last insert
+    or delete, good when keys arrive close to each other) or "auto" (the finger while keys
+    keep arriving close to it, the root otherwise)
     @rtype: int
     @returns: the number of rebalancing operation due to AVL rebalancing
     """
     def insert(self, key, val, start="root"):
         if key is None:
             return 0
+        sort_key = key if self.key_func is None else self.key_func(key)
         
         if self.root is None:
-            self.root = AVLNode(key, val)
-            self.max_node = self.root 
+            self.root = AVLNode(key, val, sort_key)
+            self.max_node = self.min_node = self.root 
+            self.version += 1
+            if self.aggregate is not None:
+                self.root.agg = self.node_aggregate(self.root)
             self._size = 1
             self.bf_zero_cnt = 1 
+            self.finger = self.root
+            if self.stats is not None:
+                self.stats.node_allocations += 1
+                self.stats.record_operation("insert", 0, 1)
             return 0
 
-        parent = None
-        current = None
+        current = self.root
 
-        if start == "root":
-            current = self.root
-        elif start == "max":
+        if start == "max":
             current = self.max_node
-            while current and current.is_real_node() and key <= current.key:
+            while current and current.is_real_node() and sort_key <= current.sort_key:
+                current = current.parent
+            if current is None:
+                return self.insert(key, val, start="root")
+        elif start == "min":
+            current = self.min_node
+            while current and current.is_real_node() and sort_key >= current.sort_key:
                 current = current.parent
             if current is None:
                 return self.insert(key, val, start="root")
+        elif start == "finger":
+            current = self.climb_from_finger(sort_key, None)
+        elif start == "auto":
+            if self.finger_score < 0:
+                self.finger_score += 1
+            else:
+                current = self.climb_from_finger(sort_key, self.root.height // 2 + 1)
+                if current is None:
+                    self.finger_score = -FINGER_BACKOFF
+                    current = self.root
+        if self.stats is not None and current is not self.root and (start == "max" or start == "min"):
+            finger = self.max_node if start == "max" else self.min_node
+            self.stats.finger_walk_length += self.path_length(current, finger) - 1
+
+        node, rotation_cnt = self.insert_from(current, key, val, sort_key)
+        self.finger = node
+        return rotation_cnt
+
+
+    def climb_from_finger(self, key, limit):
+        """
+        Climbs from the finger to the lowest ancestor whose subtree is where the sort key key belongs.
+
+        A key at rank distance d from the finger usually needs O(log d) steps, but it can
+        take up to the height of the tree when the two sit on either side of a high node.
+
+        Returns:
+        AVLNode: the node to insert below, or None after more than limit steps (limit None for no limit).
+        """
+        node = self.finger
+        if node is None:
+            return self.root
+        if node.sort_key == key:
+            return node
+        right = node.sort_key < key # key is to the right of the finger
+
+        # key next to the finger, one of the two has a free child where key goes
+        neighbour = node.next if right else node.prev
+        if neighbour is None or (neighbour.sort_key >= key if right else neighbour.sort_key <= key):
+            if neighbour is not None and (neighbour.sort_key == key or (node.right if right else node.left) is not VIRTUAL_NODE):
+                node = neighbour
+            if self.stats is not None:
+                self.stats.finger_walk_length += node is not self.finger
+            return node
+
+        steps = 0
+        while node.parent is not None:
+            parent = node.parent
+            # Stop below the first ancestor that bounds the subtree of node on the side of key
+            if (node is parent.left and not parent.sort_key < key) if right else \
+                    (node is parent.right and not key < parent.sort_key):
+                if parent.sort_key == key:
+                    node = parent
+                    steps += 1
+                break
+            node = parent
+            steps += 1
+            if limit is not None and steps > limit:
+                return None
+        if self.stats is not None:
+            self.stats.finger_walk_length += steps
+        return node
+
 
-        while current is not None and current.is_real_node():
+    def insert_from(self, current, key, val, sort_key):
+        """
+        Inserts key, which sorts as sort_key, below current, whose subtree must be where it belongs.
+
+        Returns:
+        tuple: (the node holding key, the number of rebalancing operations).
+        """
+        start = current
+        parent = None
+        virtual = VIRTUAL_NODE
+        while current is not virtual:
             parent = current
-            if key == current.key:
-                current.value = val
-                return 0
-            elif key < current.key:
+            current_key = current.sort_key
+            if sort_key < current_key:
                 current = current.left
-            else:
+            elif current_key < sort_key:
                 current = current.right
+            else:
+                current.value = val
+                self.version += 1
+                if self.aggregate is not None:
+                    self.fix_upward(current)
+                if self.stats is not None:
+                    self.stats.insert_path_length += self.path_length(start, current)
+                return current, 0
+        if self.stats is not None:
+            self.stats.insert_path_length += self.path_length(start, parent)
+        return self.attach(parent, key, val, sort_key)
+
+
+    def attach(self, parent, key, val, sort_key):
+        """
+        Hangs a new node with key under parent, which has a virtual child where key belongs.
 
+        Returns:
+        tuple: (the new node, the number of rebalancing operations).
+        """
         # Create the new node
-        new_node = AVLNode(key, val)
+        new_node = AVLNode(key, val, sort_key)
         new_node.parent = parent
+        if self.aggregate is not None:
+            new_node.agg = self.node_aggregate(new_node)
 
         if parent is None: 
             self.root = new_node 
-        elif key < parent.key:
+        elif sort_key < parent.sort_key:
             parent.left = new_node
-        else: # key > parent.key
+            self.link_between(parent.prev, new_node, parent)
+        else: # sort_key > parent.sort_key
             parent.right = new_node
-        
-        if self.max_node is None or key > self.max_node.key: 
-            self.max_node = new_node
+            self.link_between(parent, new_node, parent.next)
         
         self._size += 1
+        self.version += 1
         self.bf_zero_cnt += 1 #
         
         # Start rebalancing from the parent of the newly inserted node
-        rotation_cnt = self.rebalance_upward(new_node.parent, "insert")
+        rotation_cnt = self.retrace_insert(new_node.parent, new_node)
+        if self.order_stats or self.aggregate is not None:
+            self.fix_upward(new_node.parent)
+        if self.stats is not None:
+            self.stats.node_allocations += 1
+            self.stats.record_operation("insert", rotation_cnt, self.path_length(self.root, new_node))
         
-        return rotation_cnt
+        return new_node, rotation_cnt
 
 
     def rebalance_upward(self, node, op):
         """
-        Rebalances the AVL tree upwards from a given node.
+        Rebalances the AVL tree upwards from a given node, recomputing the height and BF
+        of every node on the way. insert and delete use the cheaper retrace_insert and
+        retrace_delete; this general form is for join, where a subtree can grow by 2.
         
         Parameters:
         node (AVLNode): The node to start rebalancing from (typically parent of inserted/deleted node).
@@ -261,56 +677,145 @@ class AVLTree(object):
         """
         rotation_cnt = 0
         current_node = node
+        stats = self.stats
 
         while current_node is not None and current_node.is_real_node():
             old_height = current_node.height
-            old_bf = current_node.BF
 
             self.fix_node_attr(current_node)
 
             height_changed_this_level = (old_height != current_node.height)
 
-            abs_BF = abs(current_node.BF)
-            if abs_BF < 2: 
-                if op == "insert" and not height_changed_this_level:
-                    return rotation_cnt
-                elif op == "delete" and not height_changed_this_level:
+            if abs(current_node.BF) < 2: 
+                if not height_changed_this_level:
                     return rotation_cnt
                 
                 rotation_cnt += 1 
+                if stats is not None:
+                    stats.height_fixes += 1
                 current_node = current_node.parent 
-            elif abs_BF == 2: 
-                # Perform rotations
-                if current_node.BF == -2: 
-                    if current_node.right.BF == -1 or (op == "delete" and current_node.right.BF == 0):
-                        rotated_node = self.left_rotation(current_node)
-                        rotation_cnt += 1
-                    elif current_node.right.BF == 1: 
-                        self.right_rotation(current_node.right) 
-                        rotated_node = self.left_rotation(current_node)
-                        rotation_cnt += 2
-                    else: 
-                        return rotation_cnt 
-                    
-                elif current_node.BF == 2: 
-                    if current_node.left.BF == 1 or (op == "delete" and current_node.left.BF == 0):
-                        rotated_node = self.right_rotation(current_node)
-                        rotation_cnt += 1
-                    elif current_node.left.BF == -1: 
-                        self.left_rotation(current_node.left) 
-                        rotated_node = self.right_rotation(current_node) 
-                        rotation_cnt += 2
-                    else: 
-                        return rotation_cnt 
-                
-                if op == "insert":
+            else:
+                rotated_node, cnt = self.rotate(current_node, current_node.BF, op)
+                rotation_cnt += cnt
+                if rotated_node is None or op == "insert":
                     return rotation_cnt
-                
                 current_node = rotated_node.parent 
             
         return rotation_cnt
 
 
+    def rotate(self, node, bf, op):
+        """
+        Rotates at node, whose BF is bf = 2 or -2, in the direction its taller child needs.
+
+        Returns:
+        tuple: (the new root of the subtree, the number of rebalancing operations),
+        (None, 0) if the taller child is balanced and op is "insert".
+        """
+        if bf < 0:
+            child_bf = node.right.BF
+            if child_bf == -1 or (op == "delete" and child_bf == 0):
+                rotated_node, cnt = self.left_rotation(node), 1
+            elif child_bf == 1:
+                self.right_rotation(node.right)
+                rotated_node, cnt = self.left_rotation(node), 2
+            else:
+                return None, 0
+        else:
+            child_bf = node.left.BF
+            if child_bf == 1 or (op == "delete" and child_bf == 0):
+                rotated_node, cnt = self.right_rotation(node), 1
+            elif child_bf == -1:
+                self.left_rotation(node.left)
+                rotated_node, cnt = self.right_rotation(node), 2
+            else:
+                return None, 0
+        if self.stats is not None:
+            if cnt == 1:
+                self.stats.single_rotations += 1
+            else:
+                self.stats.double_rotations += 1
+        return rotated_node, cnt
+
+
+    def retrace_insert(self, node, child):
+        """
+        Rebalances upwards after child, a child of node, grew by one level.
+
+        Balance factors are updated incrementally from the side that grew, and a height
+        only changes when a BF leaves 0, so the walk stops at the first node that absorbs
+        the growth. Counts the same operations as rebalance_upward(node, "insert").
+
+        Returns:
+        int: The number of rebalancing operations.
+        """
+        rotation_cnt = 0
+        stats = self.stats
+        while node is not None:
+            old_bf = node.BF
+            bf = old_bf + 1 if child is node.left else old_bf - 1
+            if bf == 0:
+                # The shorter side caught up, the height of node is unchanged
+                node.BF = 0
+                self.bf_zero_cnt += 1
+                return rotation_cnt
+            if bf == 1 or bf == -1:
+                node.BF = bf
+                node.height += 1
+                self.bf_zero_cnt -= 1
+                rotation_cnt += 1
+                if stats is not None:
+                    stats.height_fixes += 1
+                child, node = node, node.parent
+                continue
+            # After an insert one rotation restores the height node had, so the walk ends
+            return rotation_cnt + self.rotate(node, bf, "insert")[1]
+        return rotation_cnt
+
+
+    def retrace_delete(self, node, left_shrank):
+        """
+        Rebalances upwards after the left (or right) subtree of node shrank by one level.
+
+        The delete counterpart of retrace_insert: the walk goes on while subtrees keep
+        shrinking, through rotations too. Counts the same operations as
+        rebalance_upward(node, "delete").
+
+        Returns:
+        int: The number of rebalancing operations.
+        """
+        rotation_cnt = 0
+        stats = self.stats
+        while node is not None:
+            old_bf = node.BF
+            bf = old_bf - 1 if left_shrank else old_bf + 1
+            if bf == 1 or bf == -1:
+                # node was balanced, the other side still holds its height
+                node.BF = bf
+                self.bf_zero_cnt -= 1
+                return rotation_cnt
+            if bf == 0:
+                node.BF = 0
+                node.height -= 1
+                self.bf_zero_cnt += 1
+                rotation_cnt += 1
+                if stats is not None:
+                    stats.height_fixes += 1
+            else:
+                old_height = node.height
+                rotated_node, cnt = self.rotate(node, bf, "delete")
+                rotation_cnt += cnt
+                if rotated_node.height == old_height:
+                    return rotation_cnt
+                node = rotated_node
+            parent = node.parent
+            if parent is None:
+                return rotation_cnt
+            left_shrank = parent.left is node
+            node = parent
+        return rotation_cnt
+
+
     def Min(self, node):
         """Find Min value in sub tree of node"""
         if not node or not node.is_real_node(): 
@@ -323,15 +828,39 @@ class AVLTree(object):
         """Find successor of node"""
         if not node or not node.is_real_node():
             return None
-        
-        if node.right is not None and node.right.is_real_node():
-            return self.Min(node.right)
-        
-        y = node.parent
-        while (y is not None and y.is_real_node()) and (node == y.right):
-            node = y
-            y = node.parent
-        return y
+        return node.next
+
+
+    def predecessor(self, node):
+        """Find predecessor of node"""
+        if not node or not node.is_real_node():
+            return None
+        return node.prev
+
+
+    def link_between(self, prev, node, next):
+        """Threads node between prev and next (either may be None) in key order."""
+        node.prev, node.next = prev, next
+        if prev is not None:
+            prev.next = node
+        else:
+            self.min_node = node
+        if next is not None:
+            next.prev = node
+        else:
+            self.max_node = node
+
+
+    def unlink(self, node):
+        """Removes node from the key order threading."""
+        if node.prev is not None:
+            node.prev.next = node.next
+        else:
+            self.min_node = node.next
+        if node.next is not None:
+            node.next.prev = node.prev
+        else:
+            self.max_node = node.prev
 
 
     """deletes node from the dictionary
@@ -347,9 +876,9 @@ class AVLTree(object):
         if parent is None: 
             self.root = None
         elif parent.left == node:
-            parent.left = AVLNode() # Replace with a virtual node
+            parent.left = VIRTUAL_NODE # Replace with the virtual node
         else:
-            parent.right = AVLNode() # Replace with a virtual node
+            parent.right = VIRTUAL_NODE # Replace with the virtual node
         return parent # Return parent for rebalancing starting point
 
 
@@ -371,16 +900,29 @@ class AVLTree(object):
         return parent 
 
 
-    def update_max(self, key_of_deleted_node):
-        if self.root is None:
-            self.max_node = None
-            return
+    def replace_node(self, node, successor):
+        """Moves successor into the place of node, which has two real children.
 
-        if self.max_node and key_of_deleted_node == self.max_node.key:
-            curr = self.root
-            while curr is not None and curr.right is not None and curr.right.is_real_node():
-                curr = curr.right
-            self.max_node = curr
+        Returns the node to start rebalancing from."""
+        if successor is node.right:
+            parent_for_rebalance = successor # successor keeps its right subtree
+        else:
+            parent_for_rebalance = self.remove_single_child(successor)
+            successor.right = node.right
+            successor.right.parent = successor
+        successor.left = node.left
+        successor.left.parent = successor
+
+        successor.parent = node.parent
+        if node.parent is None:
+            self.root = successor
+        elif node.parent.left == node:
+            node.parent.left = successor
+        else:
+            node.parent.right = successor
+        successor.height, successor.BF = node.height, node.BF
+        successor.size, successor.zeros = node.size, node.zeros
+        return parent_for_rebalance
 
 
     def delete(self, node):
@@ -388,55 +930,832 @@ class AVLTree(object):
             return 0
 
         parent_for_rebalance = None 
-        node_key_deleted = node.key 
 
-        if node.BF == 0: 
-            self.bf_zero_cnt -= 1
-        
         if not node.left.is_real_node() and not node.right.is_real_node():
             # Case 1: node to delete is a leaf (has two virtual children)
+            if node.BF == 0: 
+                self.bf_zero_cnt -= 1
+            left_shrank = node.parent is not None and node.parent.left is node
             parent_for_rebalance = self.remove_leaf(node)
         elif not node.left.is_real_node() or not node.right.is_real_node():
             # Case 2: node to delete has only 1 real child
+            if node.BF == 0: 
+                self.bf_zero_cnt -= 1
+            left_shrank = node.parent is not None and node.parent.left is node
             parent_for_rebalance = self.remove_single_child(node)
         else: # Node has two real children - Case 3: replace with successor
-            successor = self.successor(node)
+            # The successor node itself takes the place (and BF) of node, so nodes
+            # outside the tree never hold keys of the tree
+            successor = node.next
             
             if successor.BF == 0:
                 self.bf_zero_cnt -= 1 
 
-            node.key, node.value = successor.key, successor.value
-            
-            if successor.right is not None and successor.right.is_real_node():
-                parent_for_rebalance = self.remove_single_child(successor)
-            else:
-                parent_for_rebalance = self.remove_leaf(successor)
+            # successor leaves the left spine of node.right, or is node.right itself
+            left_shrank = successor is not node.right
+            parent_for_rebalance = self.replace_node(node, successor)
 
+        self.finger = node.next if node.next is not None else node.prev
+        if self.hot_cache is not None:
+            self.hot_cache.discard(node.sort_key)
+        self.unlink(node)
         self._size -= 1 
-        self.update_max(node_key_deleted) 
-
-        rotation_cnt = self.rebalance_upward(parent_for_rebalance, "delete")
+        self.version += 1
+
+        rotation_cnt = self.retrace_delete(parent_for_rebalance, left_shrank)
+        if self.order_stats or self.aggregate is not None:
+            self.fix_upward(parent_for_rebalance)
+        if self.stats is not None:
+            depth = self.path_length(self.root, parent_for_rebalance) if parent_for_rebalance else 0
+            self.stats.record_operation("delete", rotation_cnt, depth)
         
         return rotation_cnt
 
+    """deletes the item with key from the dictionary, with a single search
+
+    @type key: int
+    @param key: the key to delete, it does not have to appear in the dictionary
+    @rtype: int
+    @returns: the number of rebalancing operation due to AVL rebalancing
+    """
+    def delete_key(self, key):
+        return self.delete(self.search(key))
+
+
+    """removes the item with the smallest key from the dictionary
+
+    @rtype: tuple
+    @returns: the removed (key, value) pair, None if the dictionary is empty
+    """
+    def pop_min(self):
+        node = self.min_node
+        if node is None:
+            return None
+        self.delete(node)
+        return node.key, node.value
+
+
+    """removes the item with the biggest key from the dictionary
+
+    @rtype: tuple
+    @returns: the removed (key, value) pair, None if the dictionary is empty
+    """
+    def pop_max(self):
+        node = self.max_node
+        if node is None:
+            return None
+        self.delete(node)
+        return node.key, node.value
+
+
+    """inserts a batch of items into the dictionary
+
+    @type items: iterable of (key, value) tuples
+    @param items: the items to insert, in any order. if a key repeats or already
+    appears in the dictionary its value is updated
+    @rtype: int
+    @returns: the total number of rebalancing operations due to AVL rebalancing
+    """
+    def insert_many(self, items):
+        sort_key_of = self.sort_key_of
+        batch = sorted(((sort_key_of(key), key, val) for key, val in items), key=lambda item: item[0])
+        if not batch:
+            return 0
+
+        if len(batch) * BATCH_REBUILD_RATIO >= self._size:
+            # A large batch is cheaper to merge into one O(n + m) rebuild
+            nodes = []
+            node = self.min_node
+            for sort_key, key, val in batch:
+                while node is not None and node.sort_key < sort_key:
+                    nodes.append(node)
+                    node = node.next
+                if node is not None and node.sort_key == sort_key:
+                    node.value = val
+                elif nodes and nodes[-1].sort_key == sort_key:
+                    nodes[-1].value = val
+                else:
+                    nodes.append(AVLNode(key, val, sort_key))
+            while node is not None:
+                nodes.append(node)
+                node = node.next
+            self.rebuild(nodes)
+            return 0
+
+        # Every key is looked for by walking forward from the node of the previous key
+        rotation_cnt = 0
+        finger = None
+        for sort_key, key, val in batch:
+            if finger is None and self.root is None:
+                cnt = self.insert(key, val)
+                finger = self.root
+            elif finger is None:
+                finger, cnt = self.insert_from(self.root, key, val, sort_key)
+            else:
+                node = self.walk_forward(finger, sort_key)
+                if node is None:
+                    finger, cnt = self.insert_from(self.root, key, val, sort_key)
+                elif node.sort_key == sort_key:
+                    node.value = val
+                    self.version += 1
+                    if self.aggregate is not None:
+                        self.fix_upward(node)
+                    finger, cnt = node, 0
+                else:
+                    # key goes between node and node.next, one of them has a free child there
+                    parent = node if not node.right.is_real_node() else node.next
+                    finger, cnt = self.attach(parent, key, val, sort_key)
+            rotation_cnt += cnt
+        return rotation_cnt
+
+
+    def walk_forward(self, finger, key):
+        """
+        Follows the next threads from finger to the last node with a sort key <= key.
+
+        Parameters:
+        finger (AVLNode): a node with finger.sort_key <= key.
+        key: the sort key to walk to.
+
+        Returns:
+        AVLNode: the node, or None if it is farther than the height of the tree,
+        in which case a search from the root is as cheap.
+        """
+        node = finger
+        for steps in range(self.root.height + 1):
+            if node.next is None or key < node.next.sort_key:
+                if self.stats is not None:
+                    self.stats.finger_walk_length += steps
+                return node
+            node = node.next
+        return None
+
+
+    """deletes a batch of keys from the dictionary
+
+    @type keys: iterable
+    @param keys: the keys to delete, in any order. keys that don't appear are ignored
+    @rtype: int
+    @returns: the total number of rebalancing operations due to AVL rebalancing
+    """
+    def delete_many(self, keys):
+        batch = sorted(map(self.sort_key_of, keys))
+        if not batch or self.root is None:
+            return 0
+
+        if len(batch) * BATCH_REBUILD_RATIO >= self._size:
+            nodes = []
+            node = self.min_node
+            for key in batch:
+                while node is not None and node.sort_key < key:
+                    nodes.append(node)
+                    node = node.next
+                if node is not None and node.sort_key == key:
+                    node = node.next
+            while node is not None:
+                nodes.append(node)
+                node = node.next
+            self.rebuild(nodes)
+            return 0
+
+        rotation_cnt = 0
+        finger = None
+        for key in batch:
+            node = None
+            if finger is not None and finger.sort_key <= key:
+                node = self.walk_forward(finger, key)
+            if node is None:
+                node = self.find(key)
+            elif node.sort_key != key:
+                node = None
+            if node is None:
+                continue
+            finger = node.prev # the last remaining node before the next keys of the batch
+            rotation_cnt += self.delete(node)
+            if self.root is None:
+                break
+        return rotation_cnt
+
+
     """returns an array representing dictionary 
 
     @rtype: list
     @returns: a sorted list according to key of touples (key, value) representing the data structure
     """
     def avl_to_array(self):
-        result = []
+        return list(self.items())
+
+
+    def find(self, key):
+        """Returns the node with the sort key key, None if there is none."""
+        node = self.root
+        while node is not None and node.is_real_node():
+            if key < node.sort_key:
+                node = node.left
+            elif node.sort_key < key:
+                node = node.right
+            else:
+                return node
+        return None
+
+
+    def lower_bound(self, key):
+        """Returns the node with the smallest key >= key, None if there is none."""
+        return self.lower_bound_sorted(self.sort_key_of(key))
+
+
+    def lower_bound_sorted(self, key):
+        """lower_bound() for a sort key."""
+        node, found = self.root, None
+        while node is not None and node.is_real_node():
+            if node.sort_key < key:
+                node = node.right
+            else:
+                found = node
+                node = node.left
+        return found
+
 
-        def inorder(node):
-            if node is None or not node.is_real_node():
+    def upper_bound(self, key):
+        """Returns the node with the biggest key <= key, None if there is none."""
+        if self.key_func is not None:
+            key = self.key_func(key)
+        node, found = self.root, None
+        while node is not None and node.is_real_node():
+            if key < node.sort_key:
+                node = node.left
+            else:
+                found = node
+                node = node.right
+        return found
+
+
+    def iter_nodes(self, node, hi=None):
+        """Yields node and the nodes after it in key order, up to sort key hi (inclusive).
+
+        Follows the next threads, so it needs O(1) extra memory. The tree must not
+        be changed while the generator is in use."""
+        while node is not None:
+            if hi is not None and hi < node.sort_key:
                 return
-            inorder(node.left)
-            result.append((node.key, node.value))
-            inorder(node.right)
-        
-        inorder(self.root)
+            yield node
+            node = node.next
+
+
+    def iter_nodes_reversed(self, node):
+        """Yields node and the nodes before it in descending key order, with O(1) extra memory."""
+        while node is not None:
+            yield node
+            node = node.prev
+
+
+    """returns an iterator over the (key, value) pairs of the dictionary in ascending key order
+
+    @rtype: generator
+    @returns: (key, value) tuples, produced one at a time
+    """
+    def items(self):
+        for node in self.iter_nodes(self.min_node):
+            yield node.key, node.value
+
+
+    """returns an iterator over the keys of the dictionary in ascending order
+
+    @rtype: generator
+    @returns: the keys, produced one at a time
+    """
+    def keys(self):
+        for node in self.iter_nodes(self.min_node):
+            yield node.key
+
+    __iter__ = keys
+
+
+    """returns an iterator over the values of the dictionary in ascending key order
+
+    @rtype: generator
+    @returns: the values, produced one at a time
+    """
+    def values(self):
+        for node in self.iter_nodes(self.min_node):
+            yield node.value
+
+
+    """returns an iterator over the items with keys in the range [lo, hi]
+
+    @type lo: int
+    @param lo: the smallest key of the range
+    @type hi: int
+    @param hi: the biggest key of the range
+    @rtype: generator
+    @returns: (key, value) tuples with lo <= key <= hi in ascending key order
+    """
+    def range(self, lo, hi):
+        for node in self.iter_nodes(self.lower_bound(lo), self.sort_key_of(hi)):
+            yield node.key, node.value
+
+
+    """returns an iterator over the (key, value) pairs of the dictionary in descending key order
+
+    @rtype: generator
+    @returns: (key, value) tuples, produced one at a time
+    """
+    def reversed(self):
+        for node in self.iter_nodes_reversed(self.max_node):
+            yield node.key, node.value
+
+    def __reversed__(self):
+        for node in self.iter_nodes_reversed(self.max_node):
+            yield node.key
+
+
+    """builds a dictionary from items that are already sorted by key, in O(n)
+
+    @type items: sequence of (key, value) tuples
+    @pre: keys are strictly increasing (by key_func, if the options give one)
+    @param items: the items of the new dictionary
+    @param options: constructor options of the new tree
+    @rtype: AVLTree
+    @returns: a height-balanced tree holding exactly the given items
+    """
+    @classmethod
+    def from_sorted(cls, items, **options):
+        tree = cls(**options)
+        sort_key_of = tree.sort_key_of
+        tree.rebuild([AVLNode(key, val, sort_key_of(key)) for key, val in items])
+        return tree
+
+
+    def rebuild(self, nodes):
+        """Makes self a height-balanced tree of nodes, which are in increasing key order, in O(n)."""
+        self.root = self.min_node = self.max_node = None
+        self._size = self.bf_zero_cnt = 0
+        self.version += 1
+        self.finger = None
+        if self.hot_cache is not None:
+            self.hot_cache.clear()
+        if not nodes:
+            return
+        nodes[0].prev = nodes[-1].next = None
+        for i in range(1, len(nodes)):
+            nodes[i - 1].next = nodes[i]
+            nodes[i].prev = nodes[i - 1]
+
+        aggregate = self.aggregate
+
+        def build(lo, hi, parent):
+            # Builds nodes[lo:hi] with the middle node as root
+            if lo >= hi:
+                return VIRTUAL_NODE
+            mid = (lo + hi) // 2
+            node = nodes[mid]
+            node.parent = parent
+            node.left = build(lo, mid, node)
+            node.right = build(mid + 1, hi, node)
+            left_h, right_h = node.left.height, node.right.height
+            node.height = 1 + (left_h if left_h > right_h else right_h)
+            node.BF = left_h - right_h
+            node.size = hi - lo
+            node.zeros = (node.BF == 0) + node.left.zeros + node.right.zeros
+            if aggregate is not None:
+                node.agg = self.node_aggregate(node)
+            if node.BF == 0:
+                self.bf_zero_cnt += 1
+            return node
+
+        self.root = build(0, len(nodes), None)
+        self._size = len(nodes)
+        self.min_node, self.max_node = nodes[0], nodes[-1]
+
+
+    """builds a dictionary from items in any order, in O(n log n) for the sort and O(n) for the build
+
+    @type items: iterable of (key, value) tuples
+    @param items: the items of the new dictionary, if a key repeats its last value is kept
+    @param options: constructor options of the new tree
+    @rtype: AVLTree
+    @returns: a height-balanced tree holding the given items
+    """
+    @classmethod
+    def bulk_load(cls, items, **options):
+        tree = cls(**options)
+        sort_key_of = tree.sort_key_of
+        ordered = sorted(((sort_key_of(key), key, val) for key, val in items), key=lambda item: item[0])
+        nodes = []
+        for sort_key, key, val in ordered:
+            if nodes and nodes[-1].sort_key == sort_key:
+                nodes[-1] = AVLNode(key, val, sort_key)
+            else:
+                nodes.append(AVLNode(key, val, sort_key))
+        tree.rebuild(nodes)
+        return tree
+
+
+    """writes the dictionary to a file in the compact binary format of AVLFile
+
+    @type path: str
+    @param path: the file to write, an existing file is replaced
+    @pre: the tree has no key_func
+    @pre: the keys are picklable, all ints or all strs are stored most compactly
+    """
+    def dump(self, path):
+        import AVLFile
+        AVLFile.dump(self, path)
+
+
+    """reads a file written by dump and rebuilds the dictionary in O(n)
+
+    @type path: str
+    @param options: constructor options of the new tree
+    @rtype: AVLTree
+    @returns: a height-balanced tree holding the items of the file
+    """
+    @classmethod
+    def load(cls, path, **options):
+        import AVLFile
+        return AVLFile.load(path, cls, **options)
+
+
+    """looks up an array of keys at once, against a sorted NumPy snapshot of the dictionary
+
+    @type queries: array-like
+    @param queries: the keys to look up
+    @param default: the value reported for keys that don't appear. if None, the values
+    reported for them are unspecified and found tells them apart
+    @pre: the tree has no key_func
+    @rtype: tuple
+    @returns: (found, values), a boolean mask and the values of the keys, as NumPy arrays
+    """
+    def search_many(self, queries, default=None):
+        import AVLNumpy
+        return AVLNumpy.search_many(self, queries, default)
+
+
+    """returns the keys and the values of the dictionary as read-only NumPy arrays
+
+    @rtype: tuple
+    @returns: (keys, values) in ascending key order, shared with later calls until the dictionary changes
+    """
+    def to_numpy(self):
+        import AVLNumpy
+        return AVLNumpy.snapshot(self)
+
+
+    """builds a dictionary from NumPy arrays of keys and values, in O(n log n) for the sort and O(n) for the build
+
+    @type keys: array-like
+    @param keys: the keys, in any order. if a key repeats its last value is kept
+    @type values: array-like
+    @param values: the values, one per key
+    @param options: constructor options of the new tree
+    @rtype: AVLTree
+    """
+    @classmethod
+    def from_numpy(cls, keys, values, **options):
+        import AVLNumpy
+        return AVLNumpy.from_numpy(cls, keys, values, **options)
+
+
+    def join_nodes(self, left, x, right):
+        """
+        Hangs the subtrees left and right under x and makes the result the tree of self.
+
+        Parameters:
+        left (AVLNode): root of a subtree with keys smaller than x.key (or the virtual node).
+        x (AVLNode): the connecting node, detached from any tree.
+        right (AVLNode): root of a subtree with keys bigger than x.key (or the virtual node).
+
+        Returns:
+        int: The number of rebalancing operations, O(|height(left) - height(right)| + 1).
+        """
+        left_h, right_h = left.height, right.height
+        if left.is_real_node():
+            left.parent = None
+        if right.is_real_node():
+            right.parent = None
+
+        # Walk down the spine of the taller subtree to the first node no taller than the other one
+        parent = None
+        if left_h > right_h:
+            self.root = left
+            b = left
+            while b.height > right_h:
+                parent = b
+                b = b.right
+            x.left, x.right = b, right
+        else:
+            self.root = right
+            b = right
+            while b.height > left_h:
+                parent = b
+                b = b.left
+            x.left, x.right = left, b
+
+        if x.left.is_real_node():
+            x.left.parent = x
+        if x.right.is_real_node():
+            x.right.parent = x
+        x.parent = parent
+        if parent is None:
+            self.root = x
+        elif left_h > right_h:
+            parent.right = x
+        else:
+            parent.left = x
+
+        self.fix_node_attr(x)
+        rotation_cnt = self.rebalance_upward(parent, "delete")
+        if self.order_stats or self.aggregate is not None:
+            self.fix_upward(x)
+        return rotation_cnt
+
+
+    """joins self with key and another AVLTree
+
+    @type tree2: AVLTree
+    @param tree2: a dictionary to be joined with self
+    @type key: int
+    @param key: the key separting self and tree2
+    @type val: string
+    @param val: the value corresponding to key
+    @pre: all keys in self are smaller than key and all keys in tree2 are bigger than key,
+    or the other way around
+    @rtype: int
+    @returns: the number of rebalancing operations, tree2 is left empty
+    """
+    def join(self, tree2, key, val):
+        sort_key = self.sort_key_of(key)
+        if tree2.root is not None:
+            tree2_is_bigger = sort_key < tree2.root.sort_key
+        else:
+            tree2_is_bigger = self.root is None or self.root.sort_key < sort_key
+
+        small, big = (self, tree2) if tree2_is_bigger else (tree2, self)
+        left, right = small.root, big.root
+        prev_node, next_node = small.max_node, big.min_node
+        min_node, max_node = small.min_node, big.max_node
+
+        x = AVLNode(key, val, sort_key)
+        self.bf_zero_cnt += tree2.bf_zero_cnt + 1 # x starts as a BF 0 node
+        self._size += tree2._size + 1
+        rotation_cnt = self.join_nodes(left or VIRTUAL_NODE, x, right or VIRTUAL_NODE)
+        self.min_node, self.max_node = min_node, max_node
+        self.link_between(prev_node, x, next_node)
+
+        tree2.root = tree2.max_node = tree2.min_node = None
+        tree2._size = tree2.bf_zero_cnt = 0
+        self.version += 1
+        tree2.version += 1
+        tree2.finger = None
+        if tree2.hot_cache is not None:
+            tree2.hot_cache.clear()
+        return rotation_cnt
+
+
+    """splits the dictionary at key, in O(log n) on order_stats trees, whose nodes count
+    the sizes of both sides. Other trees walk the smaller side to count it,
+    O(log n + min(|left|, |right|))
+
+    @type key: int
+    @param key: the key to split at, it does not have to appear in the dictionary
+    @rtype: tuple
+    @returns: a tuple (left, right) of AVLTrees, left holds the keys smaller than key
+    and right holds the rest. self is left empty
+    """
+    def split(self, key):
+        left, right = self.new_tree(), self.new_tree()
+        if self.root is None:
+            return left, right
+
+        # The first node of right, the key order threading is cut right before it
+        key = self.sort_key_of(key)
+        boundary = self.lower_bound_sorted(key)
+
+        # Cut the search path of key, every path node goes to the side of key it lies on
+        path = []
+        node = self.root
+        while node.is_real_node():
+            path.append(node)
+            node = node.right if node.sort_key < key else node.left
+
+        left_root = right_root = VIRTUAL_NODE
+        for node in reversed(path):
+            if node.sort_key < key:
+                subtree = node.left
+                left.join_nodes(subtree, node, left_root)
+                left_root = left.root
+            else:
+                subtree = node.right
+                right.join_nodes(right_root, node, subtree)
+                right_root = right.root
+        left.root = left_root if left_root.is_real_node() else None
+        right.root = right_root if right_root.is_real_node() else None
+
+        if self.order_stats:
+            # The joins kept the counts of every subtree up to date, the roots hold the totals
+            for part in (left, right):
+                if part.root is not None:
+                    part._size, part.bf_zero_cnt = part.root.size, part.root.zeros
+        else:
+            # Joins only touch path nodes, so their zero count deltas add up to the total
+            total_zero_cnt = self.bf_zero_cnt + left.bf_zero_cnt + right.bf_zero_cnt
+            counted, size, zero_cnt = self.count_smaller(left.root, right.root)
+            other = right if counted is left.root else left
+            this = left if other is right else right
+            this._size, this.bf_zero_cnt = size, zero_cnt
+            other._size, other.bf_zero_cnt = self._size - size, total_zero_cnt - zero_cnt
+
+        if boundary is not None:
+            right.min_node, right.max_node = boundary, self.max_node
+            left.max_node = boundary.prev
+            if boundary.prev is not None:
+                boundary.prev.next = None
+                boundary.prev = None
+        else:
+            left.max_node = self.max_node
+        if left.max_node is not None:
+            left.min_node = self.min_node
+
+        self.root = self.max_node = self.min_node = None
+        self._size = self.bf_zero_cnt = 0
+        self.version += 1
+        self.finger = None
+        if self.hot_cache is not None:
+            self.hot_cache.clear()
+        return left, right
+
+
+    def count_smaller(self, root1, root2):
+        """Counts the smaller of two subtrees in O(min(n1, n2)) by walking both in turns.
+
+        Returns (root of the smaller subtree, its size, its number of BF 0 nodes)."""
+        stacks = [[root1] if root1 is not None else [], [root2] if root2 is not None else []]
+        counts = [[0, 0], [0, 0]]
+        turn = 0
+        while stacks[turn]:
+            node = stacks[turn].pop()
+            counts[turn][0] += 1
+            counts[turn][1] += node.BF == 0
+            if node.left.is_real_node():
+                stacks[turn].append(node.left)
+            if node.right.is_real_node():
+                stacks[turn].append(node.right)
+            turn = 1 - turn
+        return (root1, root2)[turn], counts[turn][0], counts[turn][1]
+
+
+    """starts keeping subtree sizes, for rank, select and count_range, in one O(n) pass
+
+    From then on every insert and delete also updates the sizes up to the root,
+    so a tree that is only appended to with start="max" gets slower.
+    """
+    def enable_order_stats(self):
+        if self.order_stats:
+            return
+        stack, post_order = [self.root] if self.root is not None else [], []
+        while stack:
+            node = stack.pop()
+            post_order.append(node)
+            if node.left.is_real_node():
+                stack.append(node.left)
+            if node.right.is_real_node():
+                stack.append(node.right)
+        for node in reversed(post_order): # children before their parents
+            node.size = 1 + node.left.size + node.right.size
+            node.zeros = (node.BF == 0) + node.left.zeros + node.right.zeros
+        self.order_stats = True
+
+
+    def check_order_stats(self):
+        """Raises ValueError if the tree does not keep subtree sizes."""
+        if not self.order_stats:
+            raise ValueError("the tree keeps no subtree sizes, construct it with order_stats=True "
+                             "or call enable_order_stats()")
+
+
+    def count_smaller_keys(self, key, inclusive):
+        """Returns the number of sort keys < key (or <= key if inclusive) in O(log n)."""
+        self.check_order_stats()
+        cnt = 0
+        node = self.root
+        while node is not None and node.is_real_node():
+            if node.sort_key < key or (inclusive and node.sort_key == key):
+                cnt += node.left.size + 1
+                node = node.right
+            else:
+                node = node.left
+        return cnt
+
+
+    """returns the rank of key in the dictionary
+
+    @type key: int
+    @param key: a key, it does not have to appear in the dictionary
+    @pre: the tree keeps subtree sizes, see enable_order_stats
+    @rtype: int
+    @returns: the number of keys smaller than or equal to key, which is the position of key
+    in the sorted order starting at 1 when key appears
+    """
+    def rank(self, key):
+        return self.count_smaller_keys(self.sort_key_of(key), True)
+
+
+    """returns the node with the k-th smallest key
+
+    @type k: int
+    @param k: a rank, between 1 and the size of the dictionary
+    @pre: the tree keeps subtree sizes, see enable_order_stats
+    @rtype: AVLNode
+    @returns: the node of rank k, None if k is out of range
+    """
+    def select(self, k):
+        self.check_order_stats()
+        if k < 1 or k > self._size:
+            return None
+        node = self.root
+        while True:
+            left_size = node.left.size
+            if k == left_size + 1:
+                return node
+            elif k <= left_size:
+                node = node.left
+            else:
+                k -= left_size + 1
+                node = node.right
+
+
+    """returns the number of keys in the range [lo, hi]
+
+    @type lo: int
+    @param lo: the smallest key of the range
+    @type hi: int
+    @param hi: the biggest key of the range
+    @pre: the tree keeps subtree sizes, see enable_order_stats
+    @rtype: int
+    @returns: the number of keys k in the dictionary with lo <= k <= hi
+    """
+    def count_range(self, lo, hi):
+        lo, hi = self.sort_key_of(lo), self.sort_key_of(hi)
+        if hi < lo:
+            return 0
+        return self.count_smaller_keys(hi, True) - self.count_smaller_keys(lo, False)
+
+
+    """returns the aggregate of the items with keys in the range [lo, hi] in O(log n)
+
+    @type lo: int
+    @param lo: the smallest key of the range
+    @type hi: int
+    @param hi: the biggest key of the range
+    @pre: the tree was constructed with an aggregate
+    @returns: the combined measures of the items with lo <= key <= hi in key order,
+    the identity of the aggregate if there are none
+    """
+    def range_aggregate(self, lo, hi):
+        aggregate = self.aggregate
+        if aggregate is None:
+            raise ValueError("the tree was constructed without an aggregate")
+        combine, virtual = aggregate.combine, VIRTUAL_NODE
+        lo, hi = self.sort_key_of(lo), self.sort_key_of(hi)
+
+        # Find the highest node in the range, the paths to lo and hi split there
+        node = self.root
+        while node is not None and node is not virtual:
+            if node.sort_key < lo:
+                node = node.right
+            elif hi < node.sort_key:
+                node = node.left
+            else:
+                break
+        if node is None or node is virtual:
+            return aggregate.identity
+        result = aggregate.measure(node.key, node.value)
+
+        # On the way to lo, every node in the range adds itself and its whole right subtree
+        current = node.left
+        while current is not virtual:
+            if current.sort_key < lo:
+                current = current.right
+                continue
+            part = aggregate.measure(current.key, current.value)
+            if current.right is not virtual:
+                part = combine(part, current.right.agg)
+            result = combine(part, result)
+            current = current.left
+
+        # And symmetrically on the way to hi
+        current = node.right
+        while current is not virtual:
+            if hi < current.sort_key:
+                current = current.left
+                continue
+            part = aggregate.measure(current.key, current.value)
+            if current.left is not virtual:
+                part = combine(current.left.agg, part)
+            result = combine(result, part)
+            current = current.right
         return result
-        
+
     """returns the number of items in dictionary 
 
     @rtype: int
@@ -0,0 +1,343 @@
+"""A struct-of-arrays AVL tree dictionary with the public API of AVLTree.
+
+Instead of one object per node, the fields of all nodes live in parallel columns:
+keys and values in lists, left, right and parent indices in array("i") columns and
+heights in an array("b") column. A node is an int handle, its index in the columns,
+and NONE (-1) stands for the virtual node. Deleted handles are reused by inserts.
+
+A node costs two list slots and 13 bytes of columns, about 30 bytes against 128 for
+an AVLNode object, and a search walks contiguous machine ints instead of chasing
+node objects. Inserts and deletes do the same rotations as AVLTree and return the
+same counts.
+
+search returns an ArrayNode, a view of a handle made on demand, which delete takes
+back. A view of a deleted node must not be used, its handle may hold another key.
+"""
+
+from array import array
+
+NONE = -1
+
+
+class ArrayNode(object):
+    """A view of the node of an ArrayAVLTree at handle index.
+
+    @type tree: ArrayAVLTree
+    @type index: int
+    @param index: the handle of the node
+    """
+    __slots__ = ("tree", "index")
+
+    def __init__(self, tree, index):
+        self.tree = tree
+        self.index = index
+
+    def __repr__(self):
+        return f"({self.key}:{self.BF})"
+
+    @property
+    def key(self):
+        return self.tree.keys[self.index]
+
+    @property
+    def value(self):
+        return self.tree.values[self.index]
+
+    @value.setter
+    def value(self, val):
+        self.tree.values[self.index] = val
+
+    @property
+    def height(self):
+        return self.tree.height[self.index]
+
+    @property
+    def BF(self):
+        return self.tree.balance(self.index)
+
+    def is_real_node(self):
+        return True
+
+
+"""
+A class implementing an AVL tree over parallel columns.
+"""
+class ArrayAVLTree(object):
+
+    """
+    Constructor.
+    """
+    def __init__(self):
+        self.keys = []
+        self.values = []
+        self.left = array("i")
+        self.right = array("i")
+        self.parent = array("i")
+        self.height = array("b")
+        self.free = [] # Handles of deleted nodes
+        self.root = NONE
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+
+    def new_node(self, key, val, parent):
+        """Returns the handle of a new leaf with key and val under parent."""
+        if self.free:
+            i = self.free.pop()
+            self.keys[i], self.values[i] = key, val
+            self.left[i] = self.right[i] = NONE
+            self.parent[i], self.height[i] = parent, 0
+            return i
+        self.keys.append(key)
+        self.values.append(val)
+        self.left.append(NONE)
+        self.right.append(NONE)
+        self.parent.append(parent)
+        self.height.append(0)
+        return len(self.keys) - 1
+
+
+    def balance(self, i):
+        """Returns the BF of the node i."""
+        left, right, height = self.left[i], self.right[i], self.height
+        return (height[left] if left != NONE else -1) - (height[right] if right != NONE else -1)
+
+
+    def fix_height(self, i):
+        left, right, height = self.left[i], self.right[i], self.height
+        left_h = height[left] if left != NONE else -1
+        right_h = height[right] if right != NONE else -1
+        height[i] = 1 + (left_h if left_h > right_h else right_h)
+
+
+    def replace_child(self, p, old, new):
+        """Puts new in the place of old, a child of p (the root if p is NONE)."""
+        if p == NONE:
+            self.root = new
+        elif self.left[p] == old:
+            self.left[p] = new
+        else:
+            self.right[p] = new
+
+
+    def right_rotation(self, b):
+        left, right, parent = self.left, self.right, self.parent
+        a = left[b]
+        left[b] = right[a]
+        if right[a] != NONE:
+            parent[right[a]] = b
+        right[a] = b
+        parent[a] = parent[b]
+        self.replace_child(parent[b], b, a)
+        parent[b] = a
+        self.fix_height(b)
+        self.fix_height(a)
+        return a
+
+
+    def left_rotation(self, b):
+        left, right, parent = self.left, self.right, self.parent
+        a = right[b]
+        right[b] = left[a]
+        if left[a] != NONE:
+            parent[left[a]] = b
+        left[a] = b
+        parent[a] = parent[b]
+        self.replace_child(parent[b], b, a)
+        parent[b] = a
+        self.fix_height(b)
+        self.fix_height(a)
+        return a
+
+
+    def rotate(self, i, bf, op):
+        """AVLTree.rotate on the node i, returns (the new root of the subtree, the number of rotations)."""
+        if bf < 0:
+            child_bf = self.balance(self.right[i])
+            if child_bf == -1 or (op == "delete" and child_bf == 0):
+                return self.left_rotation(i), 1
+            if child_bf == 1:
+                self.right_rotation(self.right[i])
+                return self.left_rotation(i), 2
+        else:
+            child_bf = self.balance(self.left[i])
+            if child_bf == 1 or (op == "delete" and child_bf == 0):
+                return self.right_rotation(i), 1
+            if child_bf == -1:
+                self.left_rotation(self.left[i])
+                return self.right_rotation(i), 2
+        return NONE, 0
+
+
+    def rebalance(self, i, op):
+        """AVLTree.rebalance_upward from the node i, returns the number of rebalancing operations."""
+        cnt = 0
+        height, parent = self.height, self.parent
+        while i != NONE:
+            old_height = height[i]
+            self.fix_height(i)
+            bf = self.balance(i)
+            if -2 < bf < 2:
+                if height[i] == old_height:
+                    return cnt
+                cnt += 1
+                i = parent[i]
+            else:
+                top, rotations = self.rotate(i, bf, op)
+                cnt += rotations
+                if top == NONE or op == "insert":
+                    return cnt
+                i = parent[top]
+        return cnt
+
+
+    """searches for a node in the dictionary corresponding to the key
+
+    @type key: int
+    @param key: a key to be searched
+    @rtype: ArrayNode
+    @returns: node corresponding to key, None if key is not found
+    """
+    def search(self, key):
+        keys, left, right = self.keys, self.left, self.right
+        i = self.root
+        while i != NONE:
+            node_key = keys[i]
+            if key < node_key:
+                i = left[i]
+            elif node_key < key:
+                i = right[i]
+            else:
+                return ArrayNode(self, i)
+        return None
+
+
+    """inserts key with val into the dictionary, if key appears its value is replaced
+
+    @type key: int
+    @type val: string
+    @param start: accepted for compatibility with AVLTree.insert, always searches from the root
+    @rtype: int
+    @returns: the number of rebalancing operations, as AVLTree.insert counts them
+    """
+    def insert(self, key, val, start="root"):
+        if key is None:
+            return 0
+        keys, left, right = self.keys, self.left, self.right
+        parent, i = NONE, self.root
+        while i != NONE:
+            node_key = keys[i]
+            if key < node_key:
+                parent, i = i, left[i]
+            elif node_key < key:
+                parent, i = i, right[i]
+            else:
+                self.values[i] = val
+                return 0
+
+        i = self.new_node(key, val, parent)
+        if parent == NONE:
+            self.root = i
+        elif key < keys[parent]:
+            left[parent] = i
+        else:
+            right[parent] = i
+        self._size += 1
+        return self.rebalance(parent, "insert")
+
+
+    """deletes node from the dictionary
+
+    @type node: ArrayNode
+    @pre: node is a view of a node in self
+    @rtype: int
+    @returns: the number of rebalancing operations, as AVLTree.delete counts them
+    """
+    def delete(self, node):
+        if not node:
+            return 0
+        left, right, parent = self.left, self.right, self.parent
+        i = node.index
+        l, r = left[i], right[i]
+        if l == NONE or r == NONE:
+            child = l if l != NONE else r
+            start = parent[i]
+            if child != NONE:
+                parent[child] = start
+            self.replace_child(start, i, child)
+        else:
+            # The successor moves into the place of i, as in AVLTree, so other handles stay valid
+            s = r
+            while left[s] != NONE:
+                s = left[s]
+            if s == r:
+                start = s
+            else:
+                start = parent[s]
+                if right[s] != NONE:
+                    parent[right[s]] = start
+                left[start] = right[s]
+                right[s] = r
+                parent[r] = s
+            left[s] = l
+            parent[l] = s
+            parent[s] = parent[i]
+            self.replace_child(parent[i], i, s)
+            self.height[s] = self.height[i]
+
+        self.keys[i] = self.values[i] = None
+        self.free.append(i)
+        self._size -= 1
+        return self.rebalance(start, "delete")
+
+
+    """returns an array representing dictionary
+
+    @rtype: list
+    @returns: a sorted list according to key of touples (key, value) representing the data structure
+    """
+    def avl_to_array(self):
+        keys, values, left, right = self.keys, self.values, self.left, self.right
+        result, stack, i = [], [], self.root
+        while stack or i != NONE:
+            while i != NONE:
+                stack.append(i)
+                i = left[i]
+            i = stack.pop()
+            result.append((keys[i], values[i]))
+            i = right[i]
+        return result
+
+
+    """returns the node with the biggest key
+
+    @rtype: ArrayNode
+    @returns: the max node, None if the dictionary is empty
+    """
+    @property
+    def max_node(self):
+        i = self.root
+        if i == NONE:
+            return None
+        while self.right[i] != NONE:
+            i = self.right[i]
+        return ArrayNode(self, i)
+
+
+    """returns the number of items in dictionary
+
+    @rtype: int
+    """
+    def size(self):
+        return self._size
+
+
+    """returns the root of the tree representing the dictionary
+
+    @rtype: ArrayNode
+    @returns: the root, None if the dictionary is empty
+    """
+    def get_root(self):
+        return ArrayNode(self, self.root) if self.root != NONE else None
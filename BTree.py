@@ -0,0 +1,274 @@
+"""An in-memory B-tree dictionary with the public API of AVLTree.
+
+Every node holds up to fanout - 1 sorted keys in a Python list, searched with
+bisect, so a lookup follows about log_fanout(n) pointers instead of log_2(n) and
+in-order scans walk long arrays. Inserts split full nodes on the way down and
+deletes refill thin nodes on the way down (CLRS), so neither walks back up.
+
+The items are BTreeEntry objects, which search returns and delete takes, like the
+nodes of AVLTree. An entry keeps its identity when it moves between nodes.
+"""
+
+import bisect
+
+
+class BTreeEntry(object):
+    """An item of a B-tree.
+
+    @type key: int
+    @param key: key of the item
+    @type value: string
+    @param value: data of the item
+    """
+    __slots__ = ("key", "value")
+
+    def __init__(self, key, value):
+        self.key = key
+        self.value = value
+
+    def __repr__(self):
+        return f"({self.key})"
+
+    def is_real_node(self):
+        return True
+
+
+class BTreeNode(object):
+    """A node of a B-tree, children is None for leaves."""
+    __slots__ = ("keys", "entries", "children")
+
+    def __init__(self, keys=None, entries=None, children=None):
+        self.keys = keys if keys is not None else []
+        self.entries = entries if entries is not None else []
+        self.children = children
+
+    def __repr__(self):
+        return "BTreeNode(%r)" % self.keys
+
+
+"""
+A class implementing a B-tree.
+"""
+class BTree(object):
+
+    """
+    Constructor.
+
+    @type fanout: int
+    @param fanout: the most children of a node, at least 4
+    """
+    def __init__(self, fanout=64):
+        self.t = max(2, fanout // 2) # the minimum degree
+        self.root = BTreeNode()
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+
+    """searches for the item in the dictionary corresponding to the key
+
+    @type key: int
+    @param key: a key to be searched
+    @rtype: BTreeEntry
+    @returns: the item of key, None if key is not found
+    """
+    def search(self, key):
+        node = self.root
+        while True:
+            keys = node.keys
+            i = bisect.bisect_left(keys, key)
+            if i < len(keys) and keys[i] == key:
+                return node.entries[i]
+            if node.children is None:
+                return None
+            node = node.children[i]
+
+
+    def split_child(self, parent, i):
+        """Splits the full i-th child of parent around its middle key, which moves up into parent."""
+        t = self.t
+        child = parent.children[i]
+        sibling = BTreeNode(child.keys[t:], child.entries[t:],
+                            child.children[t:] if child.children is not None else None)
+        parent.keys.insert(i, child.keys[t - 1])
+        parent.entries.insert(i, child.entries[t - 1])
+        parent.children.insert(i + 1, sibling)
+        del child.keys[t - 1:], child.entries[t - 1:]
+        if child.children is not None:
+            del child.children[t:]
+
+
+    """inserts key with val into the dictionary, if key appears its value is replaced
+
+    @type key: int
+    @type val: string
+    @param start: accepted for compatibility with AVLTree.insert, always searches from the root
+    @rtype: int
+    @returns: the number of node splits
+    """
+    def insert(self, key, val, start="root"):
+        entry = self.search(key)
+        if entry is not None:
+            entry.value = val
+            return 0
+
+        cnt = 0
+        full = 2 * self.t - 1
+        if len(self.root.keys) == full:
+            self.root = BTreeNode(children=[self.root])
+            self.split_child(self.root, 0)
+            cnt += 1
+        node = self.root
+        while node.children is not None:
+            i = bisect.bisect_right(node.keys, key)
+            if len(node.children[i].keys) == full:
+                self.split_child(node, i)
+                cnt += 1
+                if node.keys[i] < key:
+                    i += 1
+            node = node.children[i]
+        i = bisect.bisect_right(node.keys, key)
+        node.keys.insert(i, key)
+        node.entries.insert(i, BTreeEntry(key, val))
+        self._size += 1
+        return cnt
+
+
+    def merge_children(self, node, i):
+        """Merges the (i + 1)-th child of node and the i-th key of node into the i-th child."""
+        left, right = node.children[i], node.children.pop(i + 1)
+        left.keys.append(node.keys.pop(i))
+        left.entries.append(node.entries.pop(i))
+        left.keys.extend(right.keys)
+        left.entries.extend(right.entries)
+        if left.children is not None:
+            left.children.extend(right.children)
+
+
+    def fill_child(self, node, i):
+        """Gives the i-th child of node, which has t - 1 keys, at least t keys. Returns its new index."""
+        t = self.t
+        child = node.children[i]
+        if i > 0 and len(node.children[i - 1].keys) >= t:
+            # Borrow through node from the left sibling
+            sibling = node.children[i - 1]
+            child.keys.insert(0, node.keys[i - 1])
+            child.entries.insert(0, node.entries[i - 1])
+            node.keys[i - 1], node.entries[i - 1] = sibling.keys.pop(), sibling.entries.pop()
+            if child.children is not None:
+                child.children.insert(0, sibling.children.pop())
+        elif i < len(node.keys) and len(node.children[i + 1].keys) >= t:
+            # Borrow through node from the right sibling
+            sibling = node.children[i + 1]
+            child.keys.append(node.keys[i])
+            child.entries.append(node.entries[i])
+            node.keys[i], node.entries[i] = sibling.keys.pop(0), sibling.entries.pop(0)
+            if child.children is not None:
+                child.children.append(sibling.children.pop(0))
+        elif i < len(node.keys):
+            self.merge_children(node, i)
+        else:
+            self.merge_children(node, i - 1)
+            i -= 1
+        return i
+
+
+    """deletes the item entry from the dictionary
+
+    @type node: BTreeEntry
+    @pre: node is an item of self
+    @rtype: int
+    @returns: the number of borrows and merges
+    """
+    def delete(self, node):
+        if not node:
+            return 0
+        key, t, cnt = node.key, self.t, 0
+        current = self.root
+        while True:
+            keys = current.keys
+            i = bisect.bisect_left(keys, key)
+            found = i < len(keys) and keys[i] == key
+            if current.children is None:
+                if not found:
+                    return cnt
+                del keys[i], current.entries[i]
+                break
+            if found:
+                left, right = current.children[i], current.children[i + 1]
+                if len(left.keys) >= t or len(right.keys) >= t:
+                    # Replace the key by its predecessor (or successor), then delete that one below
+                    if len(left.keys) >= t:
+                        source, pick = left, -1
+                    else:
+                        source, pick = right, 0
+                    leaf = source
+                    while leaf.children is not None:
+                        leaf = leaf.children[pick]
+                    keys[i], current.entries[i] = leaf.keys[pick], leaf.entries[pick]
+                    key, current = leaf.keys[pick], source
+                    continue
+                self.merge_children(current, i)
+                cnt += 1
+                current = left
+                continue
+            if len(current.children[i].keys) < t:
+                i = self.fill_child(current, i)
+                cnt += 1
+            current = current.children[i]
+
+        if not self.root.keys and self.root.children is not None:
+            self.root = self.root.children[0]
+        self._size -= 1
+        return cnt
+
+
+    def iter_entries(self, node):
+        """Yields the entries of the subtree of node in key order."""
+        if node.children is None:
+            yield from node.entries
+            return
+        for i, entry in enumerate(node.entries):
+            yield from self.iter_entries(node.children[i])
+            yield entry
+        yield from self.iter_entries(node.children[-1])
+
+
+    """returns an array representing dictionary
+
+    @rtype: list
+    @returns: a sorted list according to key of touples (key, value) representing the data structure
+    """
+    def avl_to_array(self):
+        return [(entry.key, entry.value) for entry in self.iter_entries(self.root)]
+
+
+    """returns the item with the biggest key
+
+    @rtype: BTreeEntry
+    @returns: the max item, None if the dictionary is empty
+    """
+    @property
+    def max_node(self):
+        node = self.root
+        while node.children is not None:
+            node = node.children[-1]
+        return node.entries[-1] if node.entries else None
+
+
+    """returns the number of items in dictionary
+
+    @rtype: int
+    """
+    def size(self):
+        return self._size
+
+
+    """returns the root node of the tree representing the dictionary
+
+    @rtype: BTreeNode
+    @returns: the root, None if the dictionary is empty
+    """
+    def get_root(self):
+        return self.root if self._size else None
@@ -0,0 +1,198 @@
+"""A thread-safe AVL tree dictionary for many readers and few writers.
+
+The current contents are a PersistentAVLTree version. Readers take the current
+version with one attribute read and never lock; a version never changes, so a
+reader can't see a half-done rotation. Writers build a new version by path
+copying under a lock and publish it with one attribute assignment.
+
+Writes can also be queued with submit_insert / submit_delete. One writer thread
+drains the queue in batches and publishes a single new version per batch, so
+submitting threads don't wait for each other. A queued write that raises is
+skipped, the rest of its batch is still applied, and the error is passed to
+on_error or raised by the next flush().
+"""
+
+import queue
+import threading
+
+from PersistentAVLTree import PersistentAVLTree
+
+
+class ConcurrentAVLTree(object):
+
+    """
+    Constructor.
+
+    @type max_batch: int
+    @param max_batch: the most queued writes the writer thread applies per published version
+    @type on_error: callable or None
+    @param on_error: called by the writer thread as on_error(op, error) when a queued write
+    raises, op being ("insert", key, val) or ("delete", key, None). If None, flush raises it
+    """
+    def __init__(self, max_batch=1024, on_error=None):
+        self.version = PersistentAVLTree()
+        self.write_lock = threading.Lock()
+        self.max_batch = max_batch
+        self.queue = queue.Queue()
+        self.writer = None
+        self.writer_lock = threading.Lock()
+        self.on_error = on_error
+        self.errors = [] # (op, error) of failed queued writes, until flush raises them
+
+    def __len__(self):
+        return self.size()
+
+
+    """returns the current version, a consistent read-only view that later writes don't change
+
+    @rtype: PersistentAVLTree
+    """
+    def snapshot(self):
+        return self.version
+
+
+    """searches for a node in the dictionary corresponding to the key, without locking
+
+    @type key: int
+    @param key: a key to be searched
+    @rtype: PersistentAVLNode
+    @returns: node corresponding to key, None if key is not found
+    """
+    def search(self, key):
+        return self.version.search(key)
+
+
+    """returns an array representing dictionary, taken from one consistent version
+
+    @rtype: list
+    @returns: a sorted list according to key of touples (key, value) representing the data structure
+    """
+    def avl_to_array(self):
+        return self.version.avl_to_array()
+
+
+    """returns the number of items in dictionary
+
+    @rtype: int
+    """
+    def size(self):
+        return self.version.size()
+
+
+    """returns the root of the current version
+
+    @rtype: PersistentAVLNode
+    @returns: the root, None if the dictionary is empty
+    """
+    def get_root(self):
+        return self.version.get_root()
+
+
+    """inserts key with val and publishes the new version before returning
+
+    @type key: int
+    @param key: key of item that is to be inserted, if it appears its value is replaced
+    @type val: string
+    @param val: the value of the item
+    """
+    def insert(self, key, val):
+        with self.write_lock:
+            self.version = self.version.insert(key, val)
+
+
+    """deletes key and publishes the new version before returning
+
+    @type key: int
+    @param key: the key to delete, it does not have to appear in the dictionary
+    """
+    def delete(self, key):
+        with self.write_lock:
+            self.version = self.version.delete(key)
+
+
+    """queues an insert for the writer thread and returns at once
+
+    @type key: int
+    @type val: string
+    """
+    def submit_insert(self, key, val):
+        self.submit(("insert", key, val))
+
+
+    """queues a delete for the writer thread and returns at once
+
+    @type key: int
+    """
+    def submit_delete(self, key):
+        self.submit(("delete", key, None))
+
+
+    def submit(self, op):
+        """Queues op, starting the writer thread on first use."""
+        if self.writer is None:
+            with self.writer_lock:
+                if self.writer is None:
+                    self.writer = threading.Thread(target=self.run_writer, name="ConcurrentAVLTree-writer",
+                                                   daemon=True)
+                    self.writer.start()
+        self.queue.put(op)
+
+
+    """waits until every queued write is applied and visible to readers
+
+    Without on_error, raises the error of the first queued write that failed since the
+    last flush. The writes queued around it were applied.
+    """
+    def flush(self):
+        self.queue.join()
+        if self.errors:
+            errors, self.errors = self.errors, []
+            raise errors[0][1]
+
+
+    """applies the queued writes and stops the writer thread"""
+    def close(self):
+        if self.writer is not None:
+            self.queue.put(None)
+            self.writer.join()
+            self.writer = None
+
+
+    def report(self, op, error):
+        """Hands the error of a failed queued write to on_error, or keeps it for flush."""
+        if self.on_error is None:
+            self.errors.append((op, error))
+            return
+        try:
+            self.on_error(op, error)
+        except Exception as callback_error:
+            self.errors.append((op, callback_error))
+
+
+    def run_writer(self):
+        """The writer thread, applies queued writes in batches until close() queues None."""
+        while True:
+            ops = [self.queue.get()]
+            while len(ops) < self.max_batch and ops[-1] is not None:
+                try:
+                    ops.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                with self.write_lock:
+                    version = self.version
+                    for op in ops:
+                        if op is None:
+                            continue
+                        kind, key, val = op
+                        try:
+                            version = version.insert(key, val) if kind == "insert" else version.delete(key)
+                        except Exception as error:
+                            self.report(op, error)
+                    self.version = version
+            finally:
+                for _ in ops:
+                    self.queue.task_done()
+            if ops[-1] is None:
+                return
@@ -0,0 +1,335 @@
+"""An AVL tree dictionary that survives crashes, backed by a write-ahead log and checkpoints.
+
+Every insert and delete is appended to a log file before it is applied to the
+tree. Records are buffered and written (and fsynced) in groups, so a batch of
+writes costs one system call instead of one each. Every checkpoint_every records
+the whole tree is dumped to a checkpoint file with AVLTree.dump and the log
+starts over. A checkpoint that fails doesn't fail the write that started it, the
+write is already logged and applied: the log is kept, the error is kept in
+checkpoint_error and the checkpoint is tried again checkpoint_every records later.
+
+On startup the checkpoint is loaded in O(n) and the log is replayed on top of it,
+runs of inserts with insert_many and runs of deletes with delete_many. A torn
+record at the end of the log (a crash in the middle of a write) is dropped.
+Writes that were still buffered when the process died are lost; use
+sync="always" to make every write durable before it returns.
+
+Log record: op (1 byte), payload length (uint32), CRC32 of the payload (uint32),
+then the payload, the pickled key (and value for inserts).
+"""
+
+import os
+import pickle
+import struct
+import zlib
+
+from AVLTree import AVLTree
+
+RECORD = struct.Struct("<BII")
+INSERT, DELETE = 1, 2
+SYNC_MODES = ("always", "batch", "never")
+
+
+def read_log(path):
+    """Returns the (op, key, value) records of a log file and the length of its valid prefix."""
+    records = []
+    if not os.path.exists(path):
+        return records, 0
+    with open(path, "rb") as log:
+        data = log.read()
+    position = 0
+    while position + RECORD.size <= len(data):
+        op, length, crc = RECORD.unpack_from(data, position)
+        payload = data[position + RECORD.size:position + RECORD.size + length]
+        if op not in (INSERT, DELETE) or len(payload) < length or zlib.crc32(payload) != crc:
+            break
+        key, val = pickle.loads(payload)
+        records.append((op, key, val))
+        position += RECORD.size + length
+    return records, position
+
+
+def sync_directory(directory):
+    """fsyncs a directory, so that a rename in it survives a crash. A no-op where directories can't be opened."""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+"""
+A class implementing a crash-safe AVL tree dictionary.
+"""
+class DurableAVLTree(object):
+
+    """
+    Constructor, recovers the dictionary stored in directory (or creates it).
+
+    @type directory: str
+    @param directory: where the log and the checkpoint are kept
+    @type sync: str
+    @param sync: "always" fsyncs every write, "batch" fsyncs every group of writes,
+    "never" leaves flushing to the operating system
+    @type group_size: int
+    @param group_size: the number of buffered records that are written together
+    @type checkpoint_every: int
+    @param checkpoint_every: the number of logged records after which a checkpoint is taken, 0 for never
+    @param options: constructor options of the in-memory AVLTree, except key_func
+    """
+    def __init__(self, directory, sync="batch", group_size=256, checkpoint_every=100000, **options):
+        if sync not in SYNC_MODES:
+            raise ValueError("sync must be one of %s" % ", ".join(SYNC_MODES))
+        if options.get("key_func") is not None:
+            raise ValueError("checkpoints are dumps, which need a tree ordered by its keys, without a key_func")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.checkpoint_path = os.path.join(directory, "checkpoint.avl")
+        self.log_path = os.path.join(directory, "wal.log")
+        self.sync = sync
+        self.group_size = 1 if sync == "always" else group_size
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_at = checkpoint_every # logged records that start the next checkpoint
+        self.checkpoint_error = None # The error of the last failed automatic checkpoint
+        self.buffer = []
+        self.buffered_bytes = 0
+        self.logged = 0
+
+        if os.path.exists(self.checkpoint_path):
+            self.tree = AVLTree.load(self.checkpoint_path, **options)
+        else:
+            self.tree = AVLTree(**options)
+        records, valid_length = read_log(self.log_path)
+        self.replay(records)
+        self.logged = len(records)
+
+        self.log = open(self.log_path, "ab")
+        if self.log.tell() != valid_length:
+            # Drop the torn record a crash left at the end
+            self.log.truncate(valid_length)
+            self.log.seek(valid_length)
+
+    def __len__(self):
+        return self.size()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+    def replay(self, records):
+        """Applies logged records in order, each run of one kind of op as one batch."""
+        i = 0
+        while i < len(records):
+            j = i
+            while j < len(records) and records[j][0] == records[i][0]:
+                j += 1
+            if records[i][0] == INSERT:
+                self.tree.insert_many((key, val) for _, key, val in records[i:j])
+            else:
+                self.tree.delete_many(key for _, key, _ in records[i:j])
+            i = j
+
+
+    def log_end(self):
+        """Returns the length the log will have once the buffered records are written."""
+        return self.log.tell() + self.buffered_bytes
+
+
+    def append(self, op, key, val):
+        """Logs a record, writing the buffered group once it is full."""
+        payload = pickle.dumps((key, val), pickle.HIGHEST_PROTOCOL)
+        record = RECORD.pack(op, len(payload), zlib.crc32(payload)) + payload
+        self.buffer.append(record)
+        self.buffered_bytes += len(record)
+        if len(self.buffer) >= self.group_size:
+            self.commit()
+
+
+    def retract(self, end):
+        """Drops the records logged after the log length end, those of a write the tree refused."""
+        written = self.log.tell()
+        if end >= written:
+            while self.buffered_bytes > end - written:
+                self.buffered_bytes -= len(self.buffer.pop())
+            return
+        self.buffer = []
+        self.buffered_bytes = 0
+        self.log.truncate(end)
+        self.log.seek(end)
+        if self.sync != "never":
+            os.fsync(self.log.fileno())
+
+
+    def applied(self):
+        """Takes a checkpoint if enough records were logged, once the tree holds all of them."""
+        if self.checkpoint_every and self.logged >= self.checkpoint_at:
+            try:
+                self.checkpoint()
+            except Exception as error:
+                self.checkpoint_error = error
+                self.checkpoint_at = self.logged + self.checkpoint_every
+
+
+    """writes the buffered log records, after it returns they survive a crash (with sync="never", a process crash only)"""
+    def commit(self):
+        if self.buffer:
+            self.log.write(b"".join(self.buffer))
+            self.log.flush()
+            if self.sync != "never":
+                os.fsync(self.log.fileno())
+            self.logged += len(self.buffer)
+            self.buffer = []
+            self.buffered_bytes = 0
+
+
+    """dumps the tree to the checkpoint file and empties the log
+
+    The checkpoint is written to a temporary file and renamed over the old one, and
+    the rename is made durable before the log is emptied, so a crash leaves either the
+    old checkpoint and its log or the new one. Replaying a log over the checkpoint that
+    already includes it does no harm. If the dump fails, the log is kept and the error raised.
+    """
+    def checkpoint(self):
+        temporary = self.checkpoint_path + ".tmp"
+        try:
+            self.tree.dump(temporary)
+            with open(temporary, "rb") as dumped:
+                os.fsync(dumped.fileno())
+            os.replace(temporary, self.checkpoint_path)
+        except Exception:
+            if os.path.isfile(temporary):
+                os.remove(temporary)
+            raise
+        sync_directory(self.directory)
+        # The tree already holds the buffered records, the checkpoint covers them
+        self.buffer = []
+        self.buffered_bytes = 0
+        self.log.truncate(0)
+        self.log.seek(0)
+        if self.sync != "never":
+            os.fsync(self.log.fileno())
+        self.logged = 0
+        self.checkpoint_at = self.checkpoint_every
+        self.checkpoint_error = None
+
+
+    """commits the log and closes it"""
+    def close(self):
+        if not self.log.closed:
+            self.commit()
+            self.log.close()
+
+
+    """searches for a node in the dictionary corresponding to the key
+
+    @type key: int
+    @param key: a key to be searched
+    @rtype: AVLNode
+    @returns: node corresponding to key, None if key is not found
+    """
+    def search(self, key):
+        return self.tree.search(key)
+
+
+    """logs and inserts key with val
+
+    @type key: int
+    @type val: string
+    @rtype: int
+    @returns: the number of rebalancing operation due to AVL rebalancing
+    """
+    def insert(self, key, val):
+        end = self.log_end()
+        self.append(INSERT, key, val)
+        try:
+            rotation_cnt = self.tree.insert(key, val)
+        except Exception:
+            self.retract(end)
+            raise
+        self.applied()
+        return rotation_cnt
+
+
+    """logs and deletes node from the dictionary
+
+    @type node: AVLNode
+    @pre: node is a real pointer to a node in self
+    @rtype: int
+    @returns: the number of rebalancing operation due to AVL rebalancing
+    """
+    def delete(self, node):
+        if not node or not node.is_real_node():
+            return 0
+        end = self.log_end()
+        self.append(DELETE, node.key, None)
+        try:
+            rotation_cnt = self.tree.delete(node)
+        except Exception:
+            self.retract(end)
+            raise
+        self.applied()
+        return rotation_cnt
+
+
+    """logs and deletes key from the dictionary, if it appears
+
+    @type key: int
+    @rtype: int
+    @returns: the number of rebalancing operation due to AVL rebalancing
+    """
+    def delete_key(self, key):
+        return self.delete(self.tree.search(key))
+
+
+    """logs and inserts a batch of items as one group
+
+    @type items: iterable of (key, value) tuples
+    @rtype: int
+    @returns: the total number of rebalancing operations due to AVL rebalancing
+    """
+    def insert_many(self, items):
+        items = list(items)
+        end = self.log_end()
+        for key, val in items:
+            self.append(INSERT, key, val)
+        try:
+            rotation_cnt = self.tree.insert_many(items)
+        except Exception:
+            self.retract(end)
+            raise
+        self.applied()
+        return rotation_cnt
+
+
+    """returns an array representing dictionary
+
+    @rtype: list
+    @returns: a sorted list according to key of touples (key, value) representing the data structure
+    """
+    def avl_to_array(self):
+        return self.tree.avl_to_array()
+
+
+    """returns the number of items in dictionary
+
+    @rtype: int
+    """
+    def size(self):
+        return self.tree.size()
+
+
+    """returns the root of the tree representing the dictionary
+
+    @rtype: AVLNode
+    @returns: the root, None if the dictionary is empty
+    """
+    def get_root(self):
+        return self.tree.get_root()
@@ -0,0 +1,102 @@
+"""An interval tree, an AVLTree of intervals keyed by (start, end) that keeps the
+biggest interval end of every subtree in its root.
+
+A subtree whose biggest end is before the query can't hold an overlapping interval,
+and neither can the right subtree of a node that starts after the query. An
+overlap query visits every node on the search paths to its k results, so it costs
+O(min(n, (k + 1) * log n)).
+"""
+
+from AVLTree import AVLTree, Monoid, VIRTUAL_NODE
+
+MAX_END = Monoid(max, float("-inf"), lambda key, value: key[1])
+
+
+"""
+A class implementing an interval tree of closed intervals [start, end].
+"""
+class IntervalTree(object):
+
+    """
+    Constructor.
+    """
+    def __init__(self):
+        self.tree = AVLTree(aggregate=MAX_END)
+
+    def __len__(self):
+        return self.size()
+
+
+    """inserts the interval [start, end] with val, replacing the value of an equal interval
+
+    @type start: int
+    @type end: int
+    @pre: start <= end
+    @type val: string
+    @rtype: int
+    @returns: the number of rebalancing operation due to AVL rebalancing
+    """
+    def insert(self, start, end, val):
+        return self.tree.insert((start, end), val)
+
+
+    """deletes the interval [start, end]
+
+    @rtype: int
+    @returns: the number of rebalancing operation due to AVL rebalancing, 0 if the interval does not appear
+    """
+    def delete(self, start, end):
+        return self.tree.delete_key((start, end))
+
+
+    """returns the intervals that overlap [lo, hi]
+
+    @type lo: int
+    @type hi: int
+    @rtype: generator
+    @returns: (start, end, value) tuples of the intervals with start <= hi and end >= lo, in
+    ascending (start, end) order
+    """
+    def overlap(self, lo, hi):
+        virtual = VIRTUAL_NODE
+        stack, node = [], self.tree.root or virtual
+        while stack or node is not virtual:
+            # Go left while the left subtree can still reach lo
+            while node is not virtual and node.agg >= lo:
+                stack.append(node)
+                node = node.left
+            if not stack:
+                return
+            node = stack.pop()
+            start, end = node.key
+            if hi < start:
+                return # every later interval starts after hi too
+            if end >= lo:
+                yield start, end, node.value
+            node = node.right
+
+
+    """returns the intervals that contain point
+
+    @rtype: generator
+    @returns: (start, end, value) tuples with start <= point <= end
+    """
+    def stab(self, point):
+        return self.overlap(point, point)
+
+
+    """returns an array representing the intervals
+
+    @rtype: list
+    @returns: a sorted list of touples (start, end, value)
+    """
+    def avl_to_array(self):
+        return [(start, end, val) for (start, end), val in self.tree.items()]
+
+
+    """returns the number of intervals
+
+    @rtype: int
+    """
+    def size(self):
+        return self.tree.size()
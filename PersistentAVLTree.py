@@ -0,0 +1,248 @@
+"""A persistent (immutable) AVL tree.
+
+Every update returns a new tree that shares all untouched subtrees with the old one:
+only the O(log n) nodes on the root-to-leaf path, and the nodes a rotation moves,
+are copied. Old trees therefore stay valid, consistent snapshots for as long as
+someone holds them, and taking a snapshot is just keeping a reference.
+
+Nodes have no parent pointers (a shared subtree has many parents) and empty
+subtrees are None.
+"""
+
+
+class PersistentAVLNode(object):
+    """An immutable node, its height and subtree size are computed once at creation.
+
+    @type key: int
+    @param key: key of your node
+    @type value: string
+    @param value: data of your node
+    """
+    __slots__ = ("key", "value", "left", "right", "height", "size")
+
+    def __init__(self, key, value, left=None, right=None):
+        left_h = left.height if left is not None else -1
+        right_h = right.height if right is not None else -1
+        object.__setattr__(self, "key", key)
+        object.__setattr__(self, "value", value)
+        object.__setattr__(self, "left", left)
+        object.__setattr__(self, "right", right)
+        object.__setattr__(self, "height", 1 + (left_h if left_h > right_h else right_h))
+        object.__setattr__(self, "size", 1 + (left.size if left is not None else 0)
+                           + (right.size if right is not None else 0))
+
+    def __setattr__(self, name, val):
+        raise AttributeError("persistent nodes are read-only")
+
+    def __repr__(self):
+        return f"({self.key}:{self.BF})"
+
+    @property
+    def BF(self):
+        return (self.left.height if self.left is not None else -1) - \
+               (self.right.height if self.right is not None else -1)
+
+    def is_real_node(self):
+        return True
+
+
+def height(node):
+    return node.height if node is not None else -1
+
+
+def balanced(key, value, left, right):
+    """Returns a node for key with the given subtrees, rotated if their heights differ by 2."""
+    if height(left) > height(right) + 1:
+        if height(left.left) >= height(left.right): # single right rotation
+            return PersistentAVLNode(left.key, left.value, left.left,
+                                     PersistentAVLNode(key, value, left.right, right))
+        pivot = left.right # double rotation, left then right
+        return PersistentAVLNode(pivot.key, pivot.value,
+                                 PersistentAVLNode(left.key, left.value, left.left, pivot.left),
+                                 PersistentAVLNode(key, value, pivot.right, right))
+    if height(right) > height(left) + 1:
+        if height(right.right) >= height(right.left): # single left rotation
+            return PersistentAVLNode(right.key, right.value,
+                                     PersistentAVLNode(key, value, left, right.left), right.right)
+        pivot = right.left # double rotation, right then left
+        return PersistentAVLNode(pivot.key, pivot.value,
+                                 PersistentAVLNode(key, value, left, pivot.left),
+                                 PersistentAVLNode(right.key, right.value, pivot.right, right.right))
+    return PersistentAVLNode(key, value, left, right)
+
+
+def insert_node(node, key, value):
+    """Returns the root of a copy of the subtree of node that also holds key."""
+    if node is None:
+        return PersistentAVLNode(key, value)
+    if key < node.key:
+        return balanced(node.key, node.value, insert_node(node.left, key, value), node.right)
+    if node.key < key:
+        return balanced(node.key, node.value, node.left, insert_node(node.right, key, value))
+    return PersistentAVLNode(key, value, node.left, node.right)
+
+
+def pop_min_node(node):
+    """Returns (the min node of the subtree, the root of the subtree without it)."""
+    if node.left is None:
+        return node, node.right
+    min_node, left = pop_min_node(node.left)
+    return min_node, balanced(node.key, node.value, left, node.right)
+
+
+def delete_node(node, key):
+    """Returns the root of a copy of the subtree of node without key (node itself if key is missing)."""
+    if node is None:
+        return None
+    if key < node.key:
+        left = delete_node(node.left, key)
+        return node if left is node.left else balanced(node.key, node.value, left, node.right)
+    if node.key < key:
+        right = delete_node(node.right, key)
+        return node if right is node.right else balanced(node.key, node.value, node.left, right)
+    if node.left is None:
+        return node.right
+    if node.right is None:
+        return node.left
+    successor, right = pop_min_node(node.right)
+    return balanced(successor.key, successor.value, node.left, right)
+
+
+"""
+A class implementing a persistent AVL tree, every version is an immutable snapshot.
+"""
+class PersistentAVLTree(object):
+
+    """
+    Constructor, the empty tree.
+
+    @type root: PersistentAVLNode
+    @param root: the root of an existing version, used by the update methods
+    """
+    def __init__(self, root=None):
+        self.root = root
+
+    def __len__(self):
+        return self.size()
+
+    def __repr__(self):
+        return "PersistentAVLTree(%r)" % self.avl_to_array()
+
+
+    """searches for a node in the dictionary corresponding to the key
+
+    @type key: int
+    @param key: a key to be searched
+    @rtype: PersistentAVLNode
+    @returns: node corresponding to key, None if key is not found
+    """
+    def search(self, key):
+        node = self.root
+        while node is not None:
+            if key < node.key:
+                node = node.left
+            elif node.key < key:
+                node = node.right
+            else:
+                return node
+        return None
+
+
+    """returns a new version with key inserted, copying O(log n) nodes
+
+    @type key: int
+    @param key: key of item that is to be inserted, if it appears its value is replaced
+    @type val: string
+    @param val: the value of the item
+    @rtype: PersistentAVLTree
+    @returns: the new version, self is unchanged
+    """
+    def insert(self, key, val):
+        return PersistentAVLTree(insert_node(self.root, key, val))
+
+
+    """returns a new version without key, copying O(log n) nodes
+
+    @type key: int
+    @param key: the key to delete
+    @rtype: PersistentAVLTree
+    @returns: the new version (self if key does not appear), self is unchanged
+    """
+    def delete(self, key):
+        root = delete_node(self.root, key)
+        return self if root is self.root else PersistentAVLTree(root)
+
+
+    """returns the items of the dictionary in ascending key order
+
+    @rtype: generator
+    @returns: (key, value) tuples, produced one at a time with an O(log n) stack
+    """
+    def items(self):
+        stack, node = [], self.root
+        while stack or node is not None:
+            while node is not None:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            yield node.key, node.value
+            node = node.right
+
+
+    """returns an array representing dictionary
+
+    @rtype: list
+    @returns: a sorted list according to key of touples (key, value) representing the data structure
+    """
+    def avl_to_array(self):
+        return list(self.items())
+
+
+    """returns the node with the biggest key
+
+    @rtype: PersistentAVLNode
+    @returns: the max node, None if the dictionary is empty
+    """
+    @property
+    def max_node(self):
+        node = self.root
+        while node is not None and node.right is not None:
+            node = node.right
+        return node
+
+
+    """returns the number of items in dictionary
+
+    @rtype: int
+    @returns: the number of items in dictionary
+    """
+    def size(self):
+        return self.root.size if self.root is not None else 0
+
+
+    """returns the root of the tree representing the dictionary
+
+    @rtype: PersistentAVLNode
+    @returns: the root, None if the dictionary is empty
+    """
+    def get_root(self):
+        return self.root
+
+
+    """builds a version from items that are already sorted by key, in O(n)
+
+    @type items: sequence of (key, value) tuples
+    @pre: keys are strictly increasing
+    @rtype: PersistentAVLTree
+    """
+    @classmethod
+    def from_sorted(cls, items):
+        items = items if isinstance(items, (list, tuple)) else list(items)
+
+        def build(lo, hi):
+            if lo >= hi:
+                return None
+            mid = (lo + hi) // 2
+            return PersistentAVLNode(items[mid][0], items[mid][1], build(lo, mid), build(mid + 1, hi))
+
+        return cls(build(0, len(items)))
@@ -0,0 +1,326 @@
+"""A red-black tree dictionary with the public API of AVLTree.
+
+Red-black trees are less strictly balanced than AVL trees (height up to 2 log n),
+but an insert does at most 2 rotations and a delete at most 3, where an AVL delete
+can rotate at every level. That suits delete-heavy workloads.
+
+Every tree has its own black sentinel leaf, NIL, as in CLRS. Deletes move nodes
+rather than copying keys, so node handles stay valid.
+"""
+
+
+class RBNode(object):
+    """A node of a red-black tree.
+
+    @type key: int or None
+    @param key: key of your node
+    @type value: string
+    @param value: data of your node
+    """
+    __slots__ = ("key", "value", "left", "right", "parent", "red")
+
+    def __init__(self, key=None, value=None, nil=None):
+        self.key = key
+        self.value = value
+        self.left = self.right = self.parent = nil
+        self.red = key is not None
+
+    def __repr__(self):
+        return f"({self.key}:{'R' if self.red else 'B'})" if self.key is not None else "NIL"
+
+    def is_real_node(self):
+        return self.key is not None
+
+
+"""
+A class implementing a red-black tree.
+"""
+class RedBlackTree(object):
+
+    """
+    Constructor.
+    """
+    def __init__(self):
+        self.NIL = RBNode()
+        self.NIL.left = self.NIL.right = self.NIL.parent = self.NIL
+        self.root = self.NIL
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+
+    def left_rotation(self, x):
+        y = x.right
+        x.right = y.left
+        if y.left is not self.NIL:
+            y.left.parent = x
+        y.parent = x.parent
+        if x.parent is self.NIL:
+            self.root = y
+        elif x is x.parent.left:
+            x.parent.left = y
+        else:
+            x.parent.right = y
+        y.left = x
+        x.parent = y
+
+
+    def right_rotation(self, x):
+        y = x.left
+        x.left = y.right
+        if y.right is not self.NIL:
+            y.right.parent = x
+        y.parent = x.parent
+        if x.parent is self.NIL:
+            self.root = y
+        elif x is x.parent.right:
+            x.parent.right = y
+        else:
+            x.parent.left = y
+        y.right = x
+        x.parent = y
+
+
+    """searches for a node in the dictionary corresponding to the key
+
+    @type key: int
+    @param key: a key to be searched
+    @rtype: RBNode
+    @returns: node corresponding to key, None if key is not found
+    """
+    def search(self, key):
+        node, nil = self.root, self.NIL
+        while node is not nil:
+            if key < node.key:
+                node = node.left
+            elif node.key < key:
+                node = node.right
+            else:
+                return node
+        return None
+
+
+    """inserts key with val into the dictionary, if key appears its value is replaced
+
+    @type key: int
+    @type val: string
+    @param start: accepted for compatibility with AVLTree.insert, always searches from the root
+    @rtype: int
+    @returns: the number of rebalancing operations (recolorings and rotations)
+    """
+    def insert(self, key, val, start="root"):
+        nil = self.NIL
+        parent, node = nil, self.root
+        while node is not nil:
+            parent = node
+            if key < node.key:
+                node = node.left
+            elif node.key < key:
+                node = node.right
+            else:
+                node.value = val
+                return 0
+
+        z = RBNode(key, val, nil)
+        z.parent = parent
+        if parent is nil:
+            self.root = z
+        elif key < parent.key:
+            parent.left = z
+        else:
+            parent.right = z
+        self._size += 1
+        return self.insert_fixup(z)
+
+
+    def insert_fixup(self, z):
+        """Restores the red-black properties after z was inserted red, returns the operations done."""
+        cnt = 0
+        while z.parent.red:
+            grandparent = z.parent.parent
+            if z.parent is grandparent.left:
+                uncle = grandparent.right
+                if uncle.red: # recolor and continue from the grandparent
+                    z.parent.red = uncle.red = False
+                    grandparent.red = True
+                    z = grandparent
+                    cnt += 1
+                    continue
+                if z is z.parent.right:
+                    z = z.parent
+                    self.left_rotation(z)
+                    cnt += 1
+                z.parent.red = False
+                grandparent.red = True
+                self.right_rotation(grandparent)
+                cnt += 1
+            else:
+                uncle = grandparent.left
+                if uncle.red:
+                    z.parent.red = uncle.red = False
+                    grandparent.red = True
+                    z = grandparent
+                    cnt += 1
+                    continue
+                if z is z.parent.left:
+                    z = z.parent
+                    self.right_rotation(z)
+                    cnt += 1
+                z.parent.red = False
+                grandparent.red = True
+                self.left_rotation(grandparent)
+                cnt += 1
+        self.root.red = False
+        return cnt
+
+
+    def transplant(self, u, v):
+        """Puts the subtree of v in the place of the subtree of u."""
+        if u.parent is self.NIL:
+            self.root = v
+        elif u is u.parent.left:
+            u.parent.left = v
+        else:
+            u.parent.right = v
+        v.parent = u.parent
+
+
+    """deletes node from the dictionary
+
+    @type node: RBNode
+    @pre: node is a real pointer to a node in self
+    @rtype: int
+    @returns: the number of rebalancing operations (recolorings and rotations)
+    """
+    def delete(self, node):
+        nil = self.NIL
+        if not node or node is nil:
+            return 0
+        y, y_was_red = node, node.red
+        if node.left is nil:
+            x = node.right
+            self.transplant(node, node.right)
+        elif node.right is nil:
+            x = node.left
+            self.transplant(node, node.left)
+        else:
+            y = node.right
+            while y.left is not nil:
+                y = y.left
+            y_was_red = y.red
+            x = y.right
+            if y.parent is node:
+                x.parent = y
+            else:
+                self.transplant(y, y.right)
+                y.right = node.right
+                y.right.parent = y
+            self.transplant(node, y)
+            y.left = node.left
+            y.left.parent = y
+            y.red = node.red
+        self._size -= 1
+        node.left = node.right = node.parent = nil
+        cnt = 0 if y_was_red else self.delete_fixup(x)
+        nil.parent = nil
+        return cnt
+
+
+    def delete_fixup(self, x):
+        """Restores the red-black properties after a black node left the path of x."""
+        cnt = 0
+        while x is not self.root and not x.red:
+            if x is x.parent.left:
+                w = x.parent.right
+                if w.red:
+                    w.red, x.parent.red = False, True
+                    self.left_rotation(x.parent)
+                    w = x.parent.right
+                    cnt += 1
+                if not w.left.red and not w.right.red:
+                    w.red = True
+                    x = x.parent
+                    cnt += 1
+                    continue
+                if not w.right.red:
+                    w.left.red, w.red = False, True
+                    self.right_rotation(w)
+                    w = x.parent.right
+                    cnt += 1
+                w.red, x.parent.red, w.right.red = x.parent.red, False, False
+                self.left_rotation(x.parent)
+                cnt += 1
+                x = self.root
+            else:
+                w = x.parent.left
+                if w.red:
+                    w.red, x.parent.red = False, True
+                    self.right_rotation(x.parent)
+                    w = x.parent.left
+                    cnt += 1
+                if not w.right.red and not w.left.red:
+                    w.red = True
+                    x = x.parent
+                    cnt += 1
+                    continue
+                if not w.left.red:
+                    w.right.red, w.red = False, True
+                    self.left_rotation(w)
+                    w = x.parent.left
+                    cnt += 1
+                w.red, x.parent.red, w.left.red = x.parent.red, False, False
+                self.right_rotation(x.parent)
+                cnt += 1
+                x = self.root
+        x.red = False
+        return cnt
+
+
+    """returns an array representing dictionary
+
+    @rtype: list
+    @returns: a sorted list according to key of touples (key, value) representing the data structure
+    """
+    def avl_to_array(self):
+        result, stack, node, nil = [], [], self.root, self.NIL
+        while stack or node is not nil:
+            while node is not nil:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            result.append((node.key, node.value))
+            node = node.right
+        return result
+
+
+    """returns the node with the biggest key
+
+    @rtype: RBNode
+    @returns: the max node, None if the dictionary is empty
+    """
+    @property
+    def max_node(self):
+        node, nil = self.root, self.NIL
+        if node is nil:
+            return None
+        while node.right is not nil:
+            node = node.right
+        return node
+
+
+    """returns the number of items in dictionary
+
+    @rtype: int
+    """
+    def size(self):
+        return self._size
+
+
+    """returns the root of the tree representing the dictionary
+
+    @rtype: RBNode
+    @returns: the root, None if the dictionary is empty
+    """
+    def get_root(self):
+        return self.root if self.root is not self.NIL else None
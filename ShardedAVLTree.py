@@ -0,0 +1,243 @@
+"""An AVL tree dictionary range-partitioned across several AVLTree shards.
+
+Shard i holds the keys k with boundaries[i - 1] <= k < boundaries[i], so point
+operations touch one shard and range queries only the shards that overlap the
+range. Shards that grow much bigger than the average are evened out again with
+join, select and split, which are all O(log n) on the order_stats shards, so a
+rebalance costs O(shards * log n) rather than a rebuild.
+
+CPython trees can't be shared between processes, so the shards live and are
+built in this process: shipping items to a worker just to sort them costs about
+as much as the sort. What does run in a process pool is export, which hands the
+items of every shard to a function doing its own heavy work, like compression.
+"""
+
+import bisect
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+from AVLTree import AVLTree
+
+# Exports smaller than this run in this process, a pool round trip costs more
+POOL_MIN_ITEMS = 50000
+
+
+def sort_unique(items):
+    """Sorts (key, value) items by key and keeps the last value of a repeated key."""
+    ordered = sorted(items, key=lambda item: item[0])
+    unique = []
+    for item in ordered:
+        if unique and unique[-1][0] == item[0]:
+            unique[-1] = item
+        else:
+            unique.append(item)
+    return unique
+
+
+"""
+A class implementing a range-partitioned AVL tree.
+"""
+class ShardedAVLTree(object):
+
+    """
+    Constructor.
+
+    @type boundaries: list
+    @param boundaries: the sorted keys where the shards start, except the first one
+    @type processes: int
+    @param processes: process pool size for export, None for one per CPU
+    @type skew: float
+    @param skew: a shard is rebalanced once it holds skew times the average shard size
+    """
+    def __init__(self, boundaries=(), processes=None, skew=2.0):
+        self.boundaries = list(boundaries)
+        self.shards = [AVLTree(order_stats=True) for _ in range(len(self.boundaries) + 1)]
+        self.processes = processes if processes is not None else os.cpu_count() or 1
+        self.skew = skew
+        self._size = 0 # The total size of the shards
+
+    def __len__(self):
+        return self.size()
+
+
+    def shard_index(self, key):
+        """Returns the index of the shard key belongs to."""
+        return bisect.bisect_right(self.boundaries, key)
+
+
+    def map_partitions(self, function, partitions):
+        """Applies function to every partition, in the process pool when they are big enough."""
+        if self.processes > 1 and sum(len(partition) for partition in partitions) >= POOL_MIN_ITEMS:
+            with ProcessPoolExecutor(max_workers=min(self.processes, len(partitions))) as pool:
+                return list(pool.map(function, partitions))
+        return [function(partition) for partition in partitions]
+
+
+    def partition(self, items):
+        """Splits items into one list per shard."""
+        partitions = [[] for _ in self.shards]
+        boundaries = self.boundaries
+        for item in items:
+            partitions[bisect.bisect_right(boundaries, item[0])].append(item)
+        return partitions
+
+
+    """builds a sharded dictionary from items in any order
+
+    @type items: iterable of (key, value) tuples
+    @param items: the items, if a key repeats its last value is kept
+    @type shards: int
+    @param shards: the number of shards, the boundaries are chosen from a sample of the keys
+    @rtype: ShardedAVLTree
+    """
+    @classmethod
+    def bulk_build(cls, items, shards=None, processes=None, skew=2.0):
+        items = list(items)
+        processes = processes if processes is not None else os.cpu_count() or 1
+        shards = shards if shards is not None else processes
+        sample = sorted({key for key, _ in random.Random(0).sample(items, min(len(items), 100 * shards))})
+        boundaries = [sample[len(sample) * i // shards] for i in range(1, shards)] if sample else []
+        tree = cls(sorted(set(boundaries)), processes, skew)
+
+        partitions = [sort_unique(partition) for partition in tree.partition(items)]
+        tree.shards = [AVLTree.from_sorted(partition, order_stats=True) for partition in partitions]
+        tree._size = sum(len(partition) for partition in partitions)
+        return tree
+
+
+    """searches for a node in the dictionary corresponding to the key
+
+    @type key: int
+    @rtype: AVLNode
+    @returns: node corresponding to key, None if key is not found
+    """
+    def search(self, key):
+        return self.shards[self.shard_index(key)].search(key)
+
+
+    """inserts key with val into its shard
+
+    @type key: int
+    @type val: string
+    @rtype: int
+    @returns: the number of rebalancing operation due to AVL rebalancing
+    """
+    def insert(self, key, val):
+        shard = self.shards[self.shard_index(key)]
+        size = shard.size()
+        rotation_cnt = shard.insert(key, val)
+        self._size += shard.size() - size
+        if shard.size() > self.skew * max(1, self._size / len(self.shards)) and shard.size() > 1:
+            self.rebalance()
+        return rotation_cnt
+
+
+    """deletes key from its shard
+
+    @type key: int
+    @rtype: int
+    @returns: the number of rebalancing operation due to AVL rebalancing
+    """
+    def delete(self, key):
+        shard = self.shards[self.shard_index(key)]
+        size = shard.size()
+        rotation_cnt = shard.delete_key(key)
+        self._size += shard.size() - size
+        return rotation_cnt
+
+
+    """inserts a batch of items, one insert_many per shard
+
+    @type items: iterable of (key, value) tuples
+    @rtype: int
+    @returns: the total number of rebalancing operations due to AVL rebalancing
+    """
+    def insert_many(self, items):
+        partitions = self.partition(items)
+        rotation_cnt = sum(shard.insert_many(partition) for shard, partition in zip(self.shards, partitions))
+        self._size = sum(shard.size() for shard in self.shards)
+        self.rebalance()
+        return rotation_cnt
+
+
+    """returns the items with keys in the range [lo, hi], asking only the shards that overlap it
+
+    @rtype: generator
+    @returns: (key, value) tuples in ascending key order
+    """
+    def range(self, lo, hi):
+        for i in range(self.shard_index(lo), self.shard_index(hi) + 1):
+            yield from self.shards[i].range(lo, hi)
+
+
+    """returns the number of keys in the range [lo, hi] in O(shards overlapping it * log n)
+
+    @rtype: int
+    """
+    def count_range(self, lo, hi):
+        return sum(self.shards[i].count_range(lo, hi) for i in range(self.shard_index(lo), self.shard_index(hi) + 1))
+
+
+    """returns an array representing dictionary
+
+    @rtype: list
+    @returns: a sorted list according to key of touples (key, value) representing the data structure
+    """
+    def avl_to_array(self):
+        return [item for shard in self.shards for item in shard.items()]
+
+
+    """exports the dictionary one shard at a time
+
+    @type function: callable
+    @param function: a picklable function applied to the item list of every shard in the
+    process pool, for example to serialize or compress it
+    @rtype: list
+    @returns: the results of function, in key order of the shards
+    """
+    def export(self, function):
+        return self.map_partitions(function, [shard.avl_to_array() for shard in self.shards])
+
+
+    """returns the number of items in dictionary
+
+    @rtype: int
+    """
+    def size(self):
+        return self._size
+
+
+    """evens out the shard sizes when the biggest shard holds more than skew times the average
+
+    The shards are only cut again once there are at least as many items as shards,
+    fewer items couldn't give every shard a key of its own.
+
+    @rtype: bool
+    @returns: True if the shards were rebalanced
+    """
+    def rebalance(self):
+        total = self._size
+        count = len(self.shards)
+        if count == 1 or total < count or max(shard.size() for shard in self.shards) <= self.skew * max(1, total / count):
+            return False
+
+        # Concatenate the shards with join, the min item of each shard separates it from the previous ones
+        merged = self.shards[0]
+        for shard in self.shards[1:]:
+            if shard.size() == 0:
+                continue
+            if merged.size() == 0:
+                merged = shard
+                continue
+            key, val = shard.pop_min()
+            merged.join(shard, key, val)
+
+        # Cut it again at the keys of evenly spaced ranks
+        boundaries = sorted({merged.select(total * i // count + 1).key for i in range(1, count)})
+        self.boundaries, self.shards = boundaries, []
+        for boundary in boundaries:
+            left, merged = merged.split(boundary)
+            self.shards.append(left)
+        self.shards.append(merged)
+        return True
@@ -0,0 +1,210 @@
+"""A treap dictionary with the public API of AVLTree.
+
+Every node gets a random priority and the tree is a heap by priority, which makes
+its shape that of a random BST: expected depth O(log n) whatever the key order.
+Updates do 2 expected rotations and keep no balance information up to date.
+"""
+
+import random
+
+
+class TreapNode(object):
+    """A node of a treap.
+
+    @type key: int
+    @param key: key of your node
+    @type value: string
+    @param value: data of your node
+    @type priority: float
+    @param priority: the heap priority, bigger is closer to the root
+    """
+    __slots__ = ("key", "value", "left", "right", "parent", "priority")
+
+    def __init__(self, key, value, priority):
+        self.key = key
+        self.value = value
+        self.left = self.right = self.parent = None
+        self.priority = priority
+
+    def __repr__(self):
+        return f"({self.key}:{self.priority:.3f})"
+
+    def is_real_node(self):
+        return True
+
+
+"""
+A class implementing a treap.
+"""
+class Treap(object):
+
+    """
+    Constructor.
+
+    @type seed: int
+    @param seed: seed of the priorities, None for a random one
+    """
+    def __init__(self, seed=None):
+        self.root = None
+        self._size = 0
+        self.random = random.Random(seed).random
+
+    def __len__(self):
+        return self._size
+
+
+    def rotate_up(self, node):
+        """Rotates node above its parent."""
+        parent, grandparent = node.parent, node.parent.parent
+        if node is parent.left:
+            parent.left = node.right
+            if node.right is not None:
+                node.right.parent = parent
+            node.right = parent
+        else:
+            parent.right = node.left
+            if node.left is not None:
+                node.left.parent = parent
+            node.left = parent
+        parent.parent = node
+        node.parent = grandparent
+        if grandparent is None:
+            self.root = node
+        elif grandparent.left is parent:
+            grandparent.left = node
+        else:
+            grandparent.right = node
+
+
+    """searches for a node in the dictionary corresponding to the key
+
+    @type key: int
+    @param key: a key to be searched
+    @rtype: TreapNode
+    @returns: node corresponding to key, None if key is not found
+    """
+    def search(self, key):
+        node = self.root
+        while node is not None:
+            if key < node.key:
+                node = node.left
+            elif node.key < key:
+                node = node.right
+            else:
+                return node
+        return None
+
+
+    """inserts key with val into the dictionary, if key appears its value is replaced
+
+    @type key: int
+    @type val: string
+    @param start: accepted for compatibility with AVLTree.insert, always searches from the root
+    @rtype: int
+    @returns: the number of rotations
+    """
+    def insert(self, key, val, start="root"):
+        parent, node = None, self.root
+        while node is not None:
+            parent = node
+            if key < node.key:
+                node = node.left
+            elif node.key < key:
+                node = node.right
+            else:
+                node.value = val
+                return 0
+
+        node = TreapNode(key, val, self.random())
+        node.parent = parent
+        if parent is None:
+            self.root = node
+        elif key < parent.key:
+            parent.left = node
+        else:
+            parent.right = node
+        self._size += 1
+
+        cnt = 0
+        while node.parent is not None and node.parent.priority < node.priority:
+            self.rotate_up(node)
+            cnt += 1
+        return cnt
+
+
+    """deletes node from the dictionary
+
+    @type node: TreapNode
+    @pre: node is a real pointer to a node in self
+    @rtype: int
+    @returns: the number of rotations
+    """
+    def delete(self, node):
+        if not node:
+            return 0
+        # Rotate node down, below its higher priority child, until it has at most one child
+        cnt = 0
+        while node.left is not None and node.right is not None:
+            child = node.left if node.left.priority > node.right.priority else node.right
+            self.rotate_up(child)
+            cnt += 1
+
+        child = node.left if node.left is not None else node.right
+        if child is not None:
+            child.parent = node.parent
+        if node.parent is None:
+            self.root = child
+        elif node.parent.left is node:
+            node.parent.left = child
+        else:
+            node.parent.right = child
+        node.left = node.right = node.parent = None
+        self._size -= 1
+        return cnt
+
+
+    """returns an array representing dictionary
+
+    @rtype: list
+    @returns: a sorted list according to key of touples (key, value) representing the data structure
+    """
+    def avl_to_array(self):
+        result, stack, node = [], [], self.root
+        while stack or node is not None:
+            while node is not None:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            result.append((node.key, node.value))
+            node = node.right
+        return result
+
+
+    """returns the node with the biggest key
+
+    @rtype: TreapNode
+    @returns: the max node, None if the dictionary is empty
+    """
+    @property
+    def max_node(self):
+        node = self.root
+        while node is not None and node.right is not None:
+            node = node.right
+        return node
+
+
+    """returns the number of items in dictionary
+
+    @rtype: int
+    """
+    def size(self):
+        return self._size
+
+
+    """returns the root of the tree representing the dictionary
+
+    @rtype: TreapNode
+    @returns: the root, None if the dictionary is empty
+    """
+    def get_root(self):
+        return self.root
@@ -0,0 +1,37 @@
+"""Interchangeable balanced search tree engines behind the AVLTree API.
+
+Every engine supports insert(key, val), delete(node), search(key),
+avl_to_array(), size(), get_root() and max_node, so call sites can switch
+engines with a single argument:
+
+    tree = make_tree("redblack")
+
+    avl       AVLTree, the strictest balance and the fastest lookups
+    array     ArrayAVLTree, AVLTree over parallel columns, about 30 bytes per key
+    redblack  RedBlackTree, at most 3 rotations per delete, for delete-heavy workloads
+    treap     Treap, randomized balance, no balance information to maintain
+    btree     BTree, wide nodes for scan-heavy workloads, options: fanout
+"""
+
+from ArrayAVLTree import ArrayAVLTree
+from AVLTree import AVLTree
+from BTree import BTree
+from RedBlackTree import RedBlackTree
+from Treap import Treap
+
+ENGINES = {
+    "avl": AVLTree,
+    "array": ArrayAVLTree,
+    "redblack": RedBlackTree,
+    "treap": Treap,
+    "btree": BTree,
+}
+
+
+def make_tree(engine="avl", **options):
+    """Returns an empty dictionary of the named engine, options go to its constructor."""
+    try:
+        cls = ENGINES[engine]
+    except KeyError:
+        raise ValueError("unknown engine %r, expected one of %s" % (engine, ", ".join(ENGINES))) from None
+    return cls(**options)